@@ -1,12 +1,19 @@
 import pandas as pd
 import requests
+import charset_normalizer
+import codecs
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, IO
 import concurrent.futures
 import time
 import random
 from io import BytesIO
 import zipfile
+import shutil
+import tempfile
 import json
 from datetime import datetime
 import os
@@ -37,20 +44,87 @@ class DatabaseCollector:
                     raise
                 time.sleep(random.uniform(2, 5))
                 
-    def _process_csv(self, content: bytes, encoding: str = 'utf-8') -> pd.DataFrame:
+    def _download_archive(self, url: str, retries: int = 3) -> IO[bytes]:
+        """Download file into a spooled temporary file with retries and random delays"""
+        for i in range(retries):
+            archive = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+            try:
+                # Random delay between requests
+                time.sleep(random.uniform(1, 3))
+                
+                with requests.get(url, stream=True) as response:
+                    response.raise_for_status()
+                    response.raw.decode_content = True
+                    shutil.copyfileobj(response.raw, archive, 1 << 20)
+                archive.seek(0)
+                return archive
+                
+            except Exception as e:
+                archive.close()
+                self.logger.warning(f"Attempt {i+1} failed for {url}: {str(e)}")
+                if i == retries - 1:
+                    raise
+                time.sleep(random.uniform(2, 5))
+                
+    def _clean_columns(self, columns: pd.Index) -> pd.Index:
+        """Normalize column names to lowercase snake_case"""
+        return columns.astype(str).str.lower().str.replace(' ', '_', regex=False)
+        
+    def _detect_encoding(self, content: bytes, default: str = 'cp1252') -> str:
+        """Detect the text encoding from a prefix of the content"""
+        prefix = content[:131072]
+        try:
+            # Strict UTF-8 first; the incremental decoder tolerates a sequence cut at the prefix end
+            codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+        # Not UTF-8: only the Western European single-byte encodings are considered,
+        # an unrestricted guess mislabels Italian text (cp1250, cp1257, ...)
+        detected = charset_normalizer.from_bytes(prefix, cp_isolation=['cp1252', 'latin_1']).best()
+        return detected.encoding if detected is not None else default
+        
+    def _read_csv_arrow(self, source: Any, encoding: str = 'utf-8',
+                        delimiter: str = ',') -> pd.DataFrame:
+        """Parse CSV with the multithreaded Arrow reader"""
+        table = pacsv.read_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=16 << 20, encoding=encoding),
+            parse_options=pacsv.ParseOptions(delimiter=delimiter)
+        )
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+        
+    def _read_csv(self, content: bytes, encoding: str,
+                  dtype: Optional[Dict[str, Any]] = None,
+                  delimiter: str = ',') -> pd.DataFrame:
+        """Parse CSV content with a single encoding"""
+        df = None
+        if dtype is None:
+            try:
+                df = self._read_csv_arrow(pa.BufferReader(content), encoding, delimiter)
+            except pa.ArrowException as e:
+                # Arrow is stricter than pandas on malformed rows
+                self.logger.debug(f"Arrow CSV parser failed, using pandas: {str(e)}")
+        if df is None:
+            df = pd.read_csv(BytesIO(content), encoding=encoding, engine='c',
+                             sep=delimiter, dtype=dtype)
+        # Clean column names
+        df.columns = self._clean_columns(df.columns)
+        return df
+        
+    def _process_csv(self, content: bytes, encoding: Optional[str] = None,
+                     dtype: Optional[Dict[str, Any]] = None,
+                     delimiter: str = ',') -> pd.DataFrame:
         """Process CSV content"""
         try:
-            # Try different encodings
-            encodings = [encoding, 'utf-8', 'latin1', 'cp1252']
-            for enc in encodings:
-                try:
-                    df = pd.read_csv(BytesIO(content), encoding=enc)
-                    # Clean column names
-                    df.columns = [col.lower().replace(' ', '_') for col in df.columns]
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            return pd.DataFrame()
+            # An encoding set in config wins; sniff only when none is given
+            enc = encoding or self._detect_encoding(content)
+            try:
+                return self._read_csv(content, enc, dtype, delimiter)
+            except UnicodeDecodeError:
+                # latin1 maps every byte, so this parse cannot fail on decoding
+                self.logger.warning(f"Decoding as {enc} failed, falling back to latin1")
+                return self._read_csv(content, 'latin1', dtype, delimiter)
         except Exception as e:
             self.logger.error(f"Error reading CSV: {str(e)}")
             return pd.DataFrame()
@@ -68,7 +142,7 @@ class DatabaseCollector:
                 try:
                     df = pd.read_excel(BytesIO(content), sheet_name=sheet)
                     # Clean column names
-                    df.columns = [col.lower().replace(' ', '_') for col in df.columns]
+                    df.columns = self._clean_columns(df.columns)
                     return df
                 except Exception:
                     continue
@@ -94,33 +168,48 @@ class DatabaseCollector:
             
             df = pd.DataFrame(data)
             # Clean column names
-            df.columns = [col.lower().replace(' ', '_') for col in df.columns]
+            df.columns = self._clean_columns(df.columns)
             return df
         except Exception as e:
             self.logger.error(f"Error reading JSON: {str(e)}")
             return pd.DataFrame()
             
-    def _process_zip(self, content: bytes, file_type: str) -> pd.DataFrame:
-        """Process ZIP content"""
+    def _process_zip(self, archive: IO[bytes], file_type: str, member: Optional[str] = None) -> pd.DataFrame:
+        """Process ZIP content, extracting a single member"""
         try:
-            with zipfile.ZipFile(BytesIO(content)) as z:
-                # Find all files of specified type
-                matching_files = [f for f in z.namelist() if f.endswith(f'.{file_type}')]
-                
-                if not matching_files:
-                    return pd.DataFrame()
+            with zipfile.ZipFile(archive) as z:
+                if member:
+                    if member not in z.namelist():
+                        self.logger.error(f"Member {member} not found in ZIP")
+                        return pd.DataFrame()
+                else:
+                    # Find all files of specified type
+                    matching_files = [
+                        info for info in z.infolist()
+                        if info.filename.endswith(f'.{file_type}')
+                    ]
+                    
+                    if not matching_files:
+                        return pd.DataFrame()
+                    
+                    # The largest matching file is taken as the data file
+                    member = max(matching_files, key=lambda info: info.file_size).filename
                 
-                # Process first matching file
-                with z.open(matching_files[0]) as f:
+                # Decompress only the selected member
+                with z.open(member) as f:
                     if file_type == 'csv':
-                        df = pd.read_csv(f)
+                        try:
+                            df = self._read_csv_arrow(f)
+                        except pa.ArrowException:
+                            with z.open(member) as retry:
+                                df = pd.read_csv(retry)
                     elif file_type == 'xlsx':
                         df = pd.read_excel(f)
                     elif file_type == 'json':
                         df = pd.DataFrame(json.load(f))
                     
                     # Clean column names
-                    df.columns = [col.lower().replace(' ', '_') for col in df.columns]
+                    df.columns = self._clean_columns(df.columns)
                     return df
                 
         except Exception as e:
@@ -130,39 +219,46 @@ class DatabaseCollector:
     def _process_database(self, name: str, config: Dict[str, Any]) -> pd.DataFrame:
         """Process a single database"""
         try:
-            content = self._download_file(config['url'])
-            
-            if config['type'] == 'csv':
-                df = self._process_csv(content, config.get('encoding', 'utf-8'))
-            elif config['type'] == 'excel':
-                df = self._process_excel(content, config.get('sheet_name'))
-            elif config['type'] == 'json':
-                df = self._process_json(content)
-            elif config['type'] == 'zip':
-                df = self._process_zip(content, config.get('file_type', 'csv'))
+            if config['type'] == 'zip':
+                # Archives are spooled to disk instead of being held in memory
+                with self._download_archive(config['url']) as archive:
+                    df = self._process_zip(archive, config.get('file_type', 'csv'), config.get('member'))
             else:
-                self.logger.error(f"Unsupported database type: {config['type']}")
-                return pd.DataFrame()
+                content = self._download_file(config['url'])
+                
+                if config['type'] == 'csv':
+                    df = self._process_csv(
+                        content,
+                        config.get('encoding'),
+                        dtype=config.get('dtype'),
+                        delimiter=config.get('delimiter', ',')
+                    )
+                elif config['type'] == 'excel':
+                    df = self._process_excel(content, config.get('sheet_name'))
+                elif config['type'] == 'json':
+                    df = self._process_json(content)
+                else:
+                    self.logger.error(f"Unsupported database type: {config['type']}")
+                    return pd.DataFrame()
                 
             if not df.empty:
                 # Add metadata
                 df['source'] = name
-                df['collection_date'] = datetime.now()
+                df['collection_date'] = pd.Timestamp.now()
                 
                 # Convert date columns
-                date_columns = [col for col in df.columns if 'date' in col.lower()]
-                for col in date_columns:
-                    try:
-                        df[col] = pd.to_datetime(df[col])
-                    except:
-                        pass
+                date_columns = df.columns[df.columns.str.contains('date', case=False)]
+                for col in date_columns.drop('collection_date'):
+                    # ISO 8601 fast path first, then per-element format inference
+                    for fmt in ('ISO8601', 'mixed'):
+                        try:
+                            df[col] = pd.to_datetime(df[col], format=fmt, cache=True)
+                            break
+                        except (ValueError, TypeError):
+                            continue
                     
                 # Save to file
-                output_file = os.path.join(
-                    self.output_path,
-                    f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                )
-                df.to_csv(output_file, index=False, encoding='utf-8')
+                output_file = self._save_output(df, name)
                 self.logger.info(f"Saved {name} data to {output_file}")
                 
             return df
@@ -171,6 +267,23 @@ class DatabaseCollector:
             self.logger.error(f"Error processing {name}: {str(e)}")
             return pd.DataFrame()
             
+    def _save_output(self, df: pd.DataFrame, name: str) -> str:
+        """Save processed data as zstd-compressed Parquet, falling back to CSV"""
+        output_base = os.path.join(
+            self.output_path,
+            f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(table, f"{output_base}.parquet", compression='zstd',
+                           compression_level=3, use_dictionary=True)
+            return f"{output_base}.parquet"
+        except pa.ArrowException as e:
+            # Mixed-type object columns cannot be stored in Parquet
+            self.logger.warning(f"Parquet export failed for {name}, writing CSV: {str(e)}")
+            df.to_csv(f"{output_base}.csv", index=False, encoding='utf-8')
+            return f"{output_base}.csv"
+            
     def run(self) -> pd.DataFrame:
         """Run the collector on all configured databases"""
         all_data = []
@@ -2,14 +2,24 @@ import httpx
 import os
 import re
 import hashlib
+import tempfile
 import logging
-from bs4 import BeautifulSoup
+from functools import lru_cache
+from lxml import html as lh
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from .base_collector import BaseCollector
+from .download_cache import DownloadCache
 import pandas as pd
 
+HTML_PARSER = lh.HTMLParser(encoding='utf-8', huge_tree=False)
+
+@lru_cache(maxsize=65536)
+def _hostname(url: str) -> str:
+    """Estrae l'host (minuscolo, senza porta) da un URL, con cache"""
+    return urlparse(url).hostname or ''
+
 class DocumentCollector(BaseCollector):
     """Collector specializzato per documenti PDF e DOC da siti istituzionali"""
     
@@ -36,49 +46,78 @@ class DocumentCollector(BaseCollector):
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         }
+        self.output_path = config.get('output_path', 'data/documents')
+        # Filtri precompilati: un'unica regex per le estensioni e una tupla di suffissi per i domini
+        self._ext_re = re.compile(
+            r'\.(?:' + '|'.join(re.escape(ext.lstrip('.')) for ext in self.allowed_extensions) + r')$',
+            re.IGNORECASE
+        )
+        self._domain_suffixes = tuple(domain.lower() for domain in self.allowed_domains)
+        self.chunk_size = config.get('chunk_size', 64 * 1024)
+        self._cache = None
         
     def _is_allowed_domain(self, url: str) -> bool:
         """Verifica se il dominio è tra quelli consentiti"""
-        domain = urlparse(url).netloc.lower()
-        return any(allowed in domain for allowed in self.allowed_domains)
+        return _hostname(url).endswith(self._domain_suffixes)
         
     def _is_document_url(self, url: str) -> bool:
         """Verifica se l'URL punta a un documento consentito"""
-        return any(url.lower().endswith(ext) for ext in self.allowed_extensions)
+        return bool(self._ext_re.search(url))
         
-    def _generate_filename(self, content: bytes, original_url: str) -> str:
-        """Genera un nome file univoco basato sul contenuto"""
+    def _generate_filename(self, content_hash: str, original_url: str) -> str:
+        """Genera un nome file univoco basato sull'hash del contenuto"""
         ext = os.path.splitext(original_url)[1].lower()
-        content_hash = hashlib.sha256(content).hexdigest()[:12]
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        return f"{content_hash}_{timestamp}{ext}"
+        return f"{content_hash[:12]}_{timestamp}{ext}"
         
     def _download_file(self, url: str, session: httpx.Client) -> Optional[Dict[str, Any]]:
-        """Scarica un file con gestione errori e validazione"""
-        try:
-            response = session.get(url, timeout=30)
-            response.raise_for_status()
+        """Scarica un file in streaming calcolando l'hash durante la scrittura"""
+        if not self._is_document_url(url):
+            return None
             
-            if not self._is_document_url(url):
-                return None
-                
-            content = response.content
-            filename = self._generate_filename(content, url)
-            filepath = os.path.join(self.output_path, filename)
+        # Richiesta condizionale se il documento è già stato scaricato
+        cached = self._cache.get(url) if self._cache else None
+        if cached and not os.path.exists(os.path.join(self.output_path, cached['filename'])):
+            cached = None
+        headers = self._cache.conditional_headers(cached) if cached else {}
             
-            # Salva il file
-            with open(filepath, 'wb') as f:
-                f.write(content)
+        tmp_path = None
+        try:
+            os.makedirs(self.output_path, exist_ok=True)
+            with session.stream('GET', url, timeout=30, headers=headers) as response:
+                if response.status_code == 304:
+                    self.logger.info(f"Non modificato: {cached['filename']} da {url}")
+                    return self._cache.to_metadata(cached)
+                response.raise_for_status()
+                
+                # Scrivi su file temporaneo e calcola l'hash in un solo passaggio
+                h = hashlib.sha256()
+                size = 0
+                with tempfile.NamedTemporaryFile(dir=self.output_path, suffix='.part', delete=False) as tmp:
+                    tmp_path = tmp.name
+                    for chunk in response.iter_bytes(self.chunk_size):
+                        h.update(chunk)
+                        tmp.write(chunk)
+                        size += len(chunk)
+                        
+                content_hash = h.hexdigest()
+                filename = self._generate_filename(content_hash, url)
+                filepath = os.path.join(self.output_path, filename)
+                os.replace(tmp_path, filepath)
+                tmp_path = None
                 
-            # Estrai metadata
-            metadata = {
-                'filename': filename,
-                'original_url': url,
-                'download_date': datetime.now().isoformat(),
-                'file_size': len(content),
-                'content_type': response.headers.get('content-type', ''),
-                'source_domain': urlparse(url).netloc
-            }
+                # Estrai metadata
+                metadata = {
+                    'filename': filename,
+                    'original_url': url,
+                    'download_date': datetime.now().isoformat(),
+                    'file_size': size,
+                    'content_type': response.headers.get('content-type', ''),
+                    'source_domain': urlparse(url).netloc,
+                    'content_hash': content_hash
+                }
+                if self._cache:
+                    self._cache.store(metadata, response.headers)
             
             self.logger.info(f"Scaricato: {filename} da {url}")
             return metadata
@@ -87,42 +126,50 @@ class DocumentCollector(BaseCollector):
             self.logger.error(f"Errore download {url}: {str(e)}")
             return None
             
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            
     def _extract_links(self, html: str, base_url: str) -> List[str]:
         """Estrae link a documenti dalla pagina HTML"""
-        soup = BeautifulSoup(html, 'html.parser')
-        links = []
+        doc = lh.fromstring(html.encode('utf-8'), parser=HTML_PARSER)
         
-        for a in soup.find_all('a', href=True):
-            href = urljoin(base_url, a['href'])
-            if self._is_document_url(href) and self._is_allowed_domain(href):
-                links.append(href)
-                
-        return links
+        # Filtro estensione sugli href grezzi, prima di risolverli in URL assoluti
+        doc_hrefs = (href for href in doc.xpath('//a/@href') if self._ext_re.search(href))
+        abs_urls = (urljoin(base_url, href) for href in doc_hrefs)
+        return [url for url in abs_urls if _hostname(url).endswith(self._domain_suffixes)]
         
     def collect(self) -> pd.DataFrame:
         """Raccoglie documenti da tutte le URL configurate"""
         all_metadata = []
+        os.makedirs(self.output_path, exist_ok=True)
+        self._cache = DownloadCache(os.path.join(self.output_path, 'cache.db'))
         
-        with httpx.Client(headers=self.headers, follow_redirects=True) as session:
-            for url in self.config['urls']:
-                try:
-                    # Scarica pagina iniziale
-                    response = session.get(url, timeout=30)
-                    response.raise_for_status()
+        try:
+            with httpx.Client(headers=self.headers, follow_redirects=True) as session:
+                for url in self.config['urls']:
+                    try:
+                        # Scarica pagina iniziale
+                        response = session.get(url, timeout=30)
+                        response.raise_for_status()
                     
-                    # Estrai link a documenti
-                    doc_links = self._extract_links(response.text, url)
-                    self.logger.info(f"Trovati {len(doc_links)} documenti in {url}")
+                        # Estrai link a documenti
+                        doc_links = self._extract_links(response.text, url)
+                        self.logger.info(f"Trovati {len(doc_links)} documenti in {url}")
                     
-                    # Scarica ogni documento
-                    for doc_url in doc_links:
-                        metadata = self._download_file(doc_url, session)
-                        if metadata:
-                            all_metadata.append(metadata)
+                        # Scarica ogni documento
+                        for doc_url in doc_links:
+                            metadata = self._download_file(doc_url, session)
+                            if metadata:
+                                all_metadata.append(metadata)
                             
-                except Exception as e:
-                    self.logger.error(f"Errore elaborazione {url}: {str(e)}")
-                    continue
+                    except Exception as e:
+                        self.logger.error(f"Errore elaborazione {url}: {str(e)}")
+                        continue
+                    
+        finally:
+            self._cache.close()
+            self._cache = None
                     
         # Converti in DataFrame
         if not all_metadata:
@@ -0,0 +1,70 @@
+import sqlite3
+from urllib.parse import urlparse
+from typing import Dict, Any, Optional
+
+class DownloadCache:
+    """Cache SQLite dei documenti scaricati, per richieste HTTP condizionali"""
+
+    COLUMNS = ('original_url', 'etag', 'last_modified', 'filename', 'download_date',
+               'file_size', 'content_type', 'content_hash')
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS downloads (
+                original_url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                filename TEXT,
+                download_date TEXT,
+                file_size INTEGER,
+                content_type TEXT,
+                content_hash TEXT
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Restituisce la voce in cache per l'URL, se presente"""
+        row = self.conn.execute(
+            "SELECT * FROM downloads WHERE original_url = ?", (url,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Costruisce gli header If-None-Match / If-Modified-Since per una voce in cache"""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, metadata: Dict[str, Any], response_headers: Any) -> None:
+        """Registra un download riuscito con i validatori HTTP della risposta"""
+        entry = dict(metadata)
+        entry['etag'] = response_headers.get('etag')
+        entry['last_modified'] = response_headers.get('last-modified')
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO downloads ({', '.join(self.COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+            tuple(entry.get(col) for col in self.COLUMNS)
+        )
+        self.conn.commit()
+
+    def to_metadata(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte una voce in cache nel formato metadata dei collector"""
+        return {
+            'filename': entry['filename'],
+            'original_url': entry['original_url'],
+            'download_date': entry['download_date'],
+            'file_size': entry['file_size'],
+            'content_type': entry['content_type'],
+            'source_domain': urlparse(entry['original_url']).netloc,
+            'content_hash': entry['content_hash']
+        }
+
+    def close(self) -> None:
+        self.conn.close()
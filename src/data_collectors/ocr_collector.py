@@ -1,13 +1,21 @@
 import pytesseract
+import cv2
+import numpy as np
 from PIL import Image
 import pdf2image
+import fitz  # PyMuPDF
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from .base_collector import BaseCollector
 import logging
 from datetime import datetime
+import concurrent.futures
 import os
 
+def _init_ocr_worker() -> None:
+    """Limit Tesseract to one thread per worker process to avoid oversubscription"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
 class OCRCollector(BaseCollector):
     """Collector for OCR processing"""
     
@@ -16,22 +24,30 @@ class OCRCollector(BaseCollector):
         self.input_path = config.get('input_path')
         self.output_path = config.get('output_path')
         self.supported_formats = ['.pdf', '.png', '.jpg', '.jpeg', '.tiff']
+        self.max_workers = config.get('max_workers', os.cpu_count())
+        self.dpi = config.get('dpi', 200)
+        self.languages = '+'.join(config.get('languages', ['ita', 'eng']))
+        self.tesseract_config = f"--oem 1 --psm {config.get('psm', 6)}"
+        self.min_chars_per_page = config.get('min_chars_per_page', 50)
         
     def collect(self) -> pd.DataFrame:
         """Collect data from documents using OCR"""
-        all_data = []
-        
-        for root, _, files in os.walk(self.input_path):
-            for file in files:
-                if any(file.lower().endswith(fmt) for fmt in self.supported_formats):
-                    try:
-                        file_path = os.path.join(root, file)
-                        data = self._process_file(file_path)
-                        if data:
-                            all_data.append(data)
-                            
-                    except Exception as e:
-                        self.logger.error(f"Error processing {file}: {str(e)}")
+        file_paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(self.input_path)
+            for file in files
+            if any(file.lower().endswith(fmt) for fmt in self.supported_formats)
+        ]
+        if not file_paths:
+            return pd.DataFrame()
+            
+        # OCR is CPU-bound: process files in parallel across worker processes
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_ocr_worker
+        ) as executor:
+            results = executor.map(self._safe_process_file, file_paths, chunksize=4)
+            all_data = [data for data in results if data]
                         
         return pd.DataFrame(all_data) if all_data else pd.DataFrame()
     
@@ -43,6 +59,14 @@ class OCRCollector(BaseCollector):
         required_columns = self.config.get('required_columns', [])
         return all(col in data.columns for col in required_columns)
     
+    def _safe_process_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Process a single file, logging errors instead of raising"""
+        try:
+            return self._process_file(file_path)
+        except Exception as e:
+            self.logger.error(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+            return None
+    
     def _process_file(self, file_path: str) -> Dict[str, Any]:
         """Process a single file with OCR"""
         file_data = {
@@ -52,12 +76,17 @@ class OCRCollector(BaseCollector):
         }
         
         if file_path.lower().endswith('.pdf'):
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(file_path)
+            # Born-digital PDFs already embed their text: OCR only scanned ones
+            pages = self._extract_embedded_text(file_path)
+            if pages is None:
+                # Convert PDF to images
+                images = pdf2image.convert_from_path(file_path, dpi=self.dpi, thread_count=1)
+                pages = [self._extract_text(image) for image in images]
+                
             text = []
-            for i, image in enumerate(images):
+            for i, page_text in enumerate(pages):
                 text.append(f"--- Page {i+1} ---\n")
-                text.append(self._extract_text(image))
+                text.append(page_text)
             file_data['text'] = '\n'.join(text)
             
         else:
@@ -67,14 +96,33 @@ class OCRCollector(BaseCollector):
             
         return file_data
     
+    def _extract_embedded_text(self, file_path: str) -> Optional[List[str]]:
+        """Extract the text layer of a PDF, or None if it is too sparse to skip OCR"""
+        with fitz.open(file_path) as doc:
+            pages = [page.get_text().strip() for page in doc]
+            
+        if not pages or sum(len(t) for t in pages) / len(pages) < self.min_chars_per_page:
+            return None
+        return pages
+    
     def _extract_text(self, image: Image.Image) -> str:
         """Extract text from image using Tesseract"""
-        # Convert image to grayscale
-        if image.mode != 'L':
-            image = image.convert('L')
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+            
+        # Convert image to grayscale, dropping alpha
+        img = np.asarray(image)
+        if img.ndim == 3:
+            code = cv2.COLOR_RGBA2GRAY if img.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+            img = cv2.cvtColor(img, code)
             
-        # Apply OCR
-        text = pytesseract.image_to_string(image)
+        # Binarize: smaller bitmap for Tesseract and more robust to uneven lighting
+        img = cv2.adaptiveThreshold(
+            img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+        )
+            
+        # Apply OCR with the LSTM engine on a single uniform text block
+        text = pytesseract.image_to_string(img, lang=self.languages, config=self.tesseract_config)
         return text.strip()
     
     def process(self, data: pd.DataFrame) -> pd.DataFrame:
@@ -83,14 +131,23 @@ class OCRCollector(BaseCollector):
         if 'text' in data.columns:
             data['text'] = data['text'].str.strip()
             
-        # Save processed files
+        # Save processed files, overlapping disk I/O across threads
         if self.output_path:
-            for _, row in data.iterrows():
-                output_file = os.path.join(
-                    self.output_path,
-                    f"{os.path.splitext(row['filename'])[0]}_processed.txt"
-                )
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(row['text'])
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [
+                    executor.submit(self._write_text, filename, text)
+                    for filename, text in zip(data['filename'].to_numpy(), data['text'].to_numpy())
+                ]
+                for future in futures:
+                    future.result()
                     
-        return data 
\ No newline at end of file
+        return data
+    
+    def _write_text(self, filename: str, text: str) -> None:
+        """Write the extracted text of a single file"""
+        output_file = os.path.join(
+            self.output_path,
+            f"{os.path.splitext(filename)[0]}_processed.txt"
+        )
+        with open(output_file, 'wb', buffering=1 << 20) as f:
+            f.write(text.encode('utf-8'))
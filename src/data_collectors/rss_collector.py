@@ -1,10 +1,34 @@
-import feedparser
+from lxml import etree
+from io import BytesIO
 import pandas as pd
 from typing import Dict, Any, List
 from .base_collector import BaseCollector
 import logging
-from datetime import datetime
-import time
+import asyncio
+import random
+import aiohttp
+
+RFC822_FORMAT = '%a, %d %b %Y %H:%M:%S %z'
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+RSS1 = '{http://purl.org/rss/1.0/}'
+RDF = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+DC = '{http://purl.org/dc/elements/1.1/}'
+ITEM_TAGS = ('item', RSS1 + 'item', ATOM + 'entry')
+
+def _find_text(element: Any, path: str) -> str:
+    """Return the stripped text of a child element, or an empty string"""
+    child = element.find(path)
+    if child is None or child.text is None:
+        return ''
+    return child.text.strip()
+
+def _atom_link(element: Any) -> str:
+    """Return the alternate link of an Atom feed or entry"""
+    for link in element.iterfind(ATOM + 'link'):
+        if link.get('rel', 'alternate') == 'alternate':
+            return link.get('href', '')
+    return ''
 
 class RSSCollector(BaseCollector):
     """Collector for RSS feeds"""
@@ -13,18 +37,22 @@ class RSSCollector(BaseCollector):
         super().__init__(config)
         self.feeds = config.get('feeds', [])
         self.delay = config.get('delay', 1)
+        self.concurrency = config.get('concurrency', 8)
         
     def collect(self) -> pd.DataFrame:
         """Collect data from configured RSS feeds"""
         all_data = []
         
-        for feed_url in self.feeds:
-            try:
-                # Add delay to avoid overwhelming servers
-                time.sleep(self.delay)
+        # Fetch all feeds concurrently, then parse the downloaded bodies
+        bodies = asyncio.run(self._fetch_feeds())
+        
+        for feed_url, body in zip(self.feeds, bodies):
+            if isinstance(body, Exception):
+                self.logger.error(f"Error fetching feed {feed_url}: {str(body)}")
+                continue
                 
-                feed = feedparser.parse(feed_url)
-                data = self._parse_feed(feed)
+            try:
+                data = self._parse_feed(body)
                 all_data.extend(data)
                 
             except Exception as e:
@@ -32,6 +60,27 @@ class RSSCollector(BaseCollector):
                 
         return pd.DataFrame(all_data) if all_data else pd.DataFrame()
     
+    async def _fetch_feeds(self) -> List[Any]:
+        """Download all feeds concurrently, returning bodies or exceptions in feed order"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await asyncio.gather(
+                *(self._fetch_feed(session, semaphore, feed_url) for feed_url in self.feeds),
+                return_exceptions=True
+            )
+    
+    async def _fetch_feed(self, session: aiohttp.ClientSession,
+                          semaphore: asyncio.Semaphore, feed_url: str) -> bytes:
+        """Download a single feed"""
+        async with semaphore:
+            # Add jittered delay to avoid overwhelming servers
+            await asyncio.sleep(random.uniform(0, self.delay))
+            
+            async with session.get(feed_url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                response.raise_for_status()
+                return await response.read()
+    
     def validate(self, data: pd.DataFrame) -> bool:
         """Validate RSS feed data"""
         if data.empty:
@@ -40,41 +89,77 @@ class RSSCollector(BaseCollector):
         required_columns = self.config.get('required_columns', [])
         return all(col in data.columns for col in required_columns)
     
-    def _parse_feed(self, feed: Any) -> List[Dict[str, Any]]:
-        """Parse RSS feed into list of dictionaries"""
+    def _parse_feed(self, body: bytes) -> List[Dict[str, Any]]:
+        """Stream-parse an RSS or Atom feed into a list of dictionaries"""
         data = []
+        source = None
         
-        for entry in feed.entries:
-            item_data = {
-                'title': entry.get('title', ''),
-                'link': entry.get('link', ''),
-                'description': entry.get('description', ''),
-                'published': entry.get('published', ''),
-                'author': entry.get('author', ''),
-                'source': feed.feed.get('title', ''),
-                'source_url': feed.feed.get('link', '')
-            }
-            
-            # Add any additional fields from the feed
-            for key, value in entry.items():
-                if key not in item_data:
-                    item_data[key] = value
-                    
+        context = etree.iterparse(BytesIO(body), events=('end',), tag=ITEM_TAGS, recover=True)
+        for _, item in context:
+            channel = item.getparent()
+            if source is None:
+                # Channel metadata precedes the items it contains
+                source = self._parse_source(channel)
+                
+            if item.tag == ATOM + 'entry':
+                item_data = {
+                    'title': _find_text(item, ATOM + 'title'),
+                    'link': _atom_link(item),
+                    'description': _find_text(item, ATOM + 'summary') or _find_text(item, ATOM + 'content'),
+                    'published': _find_text(item, ATOM + 'published') or _find_text(item, ATOM + 'updated'),
+                    'author': _find_text(item, ATOM + 'author/' + ATOM + 'name')
+                }
+            else:
+                ns = RSS1 if item.tag == RSS1 + 'item' else ''
+                item_data = {
+                    'title': _find_text(item, ns + 'title'),
+                    'link': _find_text(item, ns + 'link'),
+                    'description': _find_text(item, ns + 'description'),
+                    'published': _find_text(item, 'pubDate') or _find_text(item, DC + 'date'),
+                    'author': _find_text(item, 'author') or _find_text(item, DC + 'creator')
+                }
+            item_data.update(source)
             data.append(item_data)
             
+            # Release parsed items to keep memory bounded
+            item.clear()
+            while item.getprevious() is not None:
+                del channel[0]
+            
         return data
     
+    def _parse_source(self, channel: Any) -> Dict[str, str]:
+        """Extract feed title and link from the channel element"""
+        if channel is None:
+            return {'source': '', 'source_url': ''}
+        if channel.tag == ATOM + 'feed':
+            return {'source': _find_text(channel, ATOM + 'title'), 'source_url': _atom_link(channel)}
+        if channel.tag == RDF + 'RDF':
+            channel = channel.find(RSS1 + 'channel')
+            if channel is None:
+                return {'source': '', 'source_url': ''}
+            return {'source': _find_text(channel, RSS1 + 'title'), 'source_url': _find_text(channel, RSS1 + 'link')}
+        return {'source': _find_text(channel, 'title'), 'source_url': _find_text(channel, 'link')}
+    
     def process(self, data: pd.DataFrame) -> pd.DataFrame:
         """Process RSS feed data"""
         # Add collection timestamp
-        data['collection_date'] = datetime.now()
+        data['collection_date'] = pd.Timestamp.now()
         
         # Convert published dates to datetime
         if 'published' in data.columns:
-            data['published'] = pd.to_datetime(data['published'], errors='coerce')
+            # RSS uses RFC 822 dates, Atom uses ISO 8601
+            published = pd.to_datetime(data['published'], format=RFC822_FORMAT,
+                                        errors='coerce', utc=True, cache=True)
+            unparsed = published.isna() & data['published'].astype(bool)
+            if unparsed.any():
+                published[unparsed] = pd.to_datetime(data.loc[unparsed, 'published'], format='mixed',
+                                                     errors='coerce', utc=True, cache=True)
+            data['published'] = published
             
         # Clean text data
-        for col in data.select_dtypes(include=['object']).columns:
-            data[col] = data[col].str.strip() if data[col].dtype == 'object' else data[col]
+        text_columns = data.select_dtypes(include=['object']).columns
+        if len(text_columns):
+            data[text_columns] = data[text_columns].apply(lambda s: s.str.strip())
             
         return data 
\ No newline at end of file
@@ -1,14 +1,47 @@
 import httpx
 import os
+import re
 import hashlib
+import tempfile
 import time
 import logging
-from bs4 import BeautifulSoup
+import io
+import gzip
+from collections import deque
+from lxml import etree
 from urllib.parse import urlparse
 from datetime import datetime
 import pandas as pd
-from typing import List, Dict, Any
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from typing import List, Dict, Any, Iterator, Tuple
 from .base_collector import BaseCollector
+from .download_cache import DownloadCache
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+SITEMAP_ENTRY_TAGS = (SITEMAP_NS + 'url', SITEMAP_NS + 'sitemap', 'url', 'sitemap')
+GZIP_MAGIC = b'\x1f\x8b'
+
+class _ChunkStream(io.RawIOBase):
+    """Adatta un iteratore di chunk di byte a un file-like in sola lettura"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
 
 class SitemapDocumentCollector(BaseCollector):
     """Collector che scarica documenti da sitemap.xml di siti istituzionali"""
@@ -18,6 +51,13 @@ class SitemapDocumentCollector(BaseCollector):
         self.sitemap_urls = config.get('sitemap_urls', [])
         self.allowed_extensions = config.get('allowed_extensions', ['.pdf', '.doc', '.docx'])
         self.sleep_time = config.get('sleep_time', 2)
+        self.output_path = config.get('output_path', 'data/documents/sitemap')
+        self.chunk_size = config.get('chunk_size', 64 * 1024)
+        self._ext_re = re.compile(
+            r'\.(?:' + '|'.join(re.escape(ext.lstrip('.')) for ext in self.allowed_extensions) + r')$',
+            re.IGNORECASE
+        )
+        self._cache = None
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
             "Referer": "https://google.com",
@@ -28,47 +68,95 @@ class SitemapDocumentCollector(BaseCollector):
         
     def _get_urls_from_sitemap(self, sitemap_url: str) -> List[str]:
         urls = []
-        try:
-            with httpx.Client(headers=self.headers, follow_redirects=True, http2=False) as session:
-                r = session.get(sitemap_url, timeout=30)
-                soup = BeautifulSoup(r.text, "xml")
-                for loc in soup.find_all("loc"):
-                    urls.append(loc.text)
-        except Exception as e:
-            self.logger.error(f"Errore parsing sitemap {sitemap_url}: {e}")
+        # Sitemap index: le sitemap figlie vengono accodate e visitate iterativamente
+        queue = deque([sitemap_url])
+        seen = set()
+        with httpx.Client(headers=self.headers, follow_redirects=True, http2=False) as session:
+            while queue:
+                current = queue.popleft()
+                if current in seen:
+                    continue
+                seen.add(current)
+                try:
+                    for is_sitemap, loc in self._iter_sitemap(current, session):
+                        if is_sitemap:
+                            queue.append(loc)
+                        else:
+                            urls.append(loc)
+                except Exception as e:
+                    self.logger.error(f"Errore parsing sitemap {current}: {e}")
         return urls
 
-    def _is_document_url(self, url: str) -> bool:
-        return any(url.lower().endswith(ext) for ext in self.allowed_extensions)
+    def _iter_sitemap(self, sitemap_url: str, session: httpx.Client) -> Iterator[Tuple[bool, str]]:
+        """Decomprime e analizza la sitemap in streaming, restituendo (is_sitemap, loc)"""
+        with session.stream('GET', sitemap_url, timeout=30) as r:
+            r.raise_for_status()
+            stream = io.BufferedReader(_ChunkStream(r.iter_bytes(self.chunk_size)), self.chunk_size)
+            # .xml.gz servite senza Content-Encoding arrivano ancora compresse
+            if stream.peek(2)[:2] == GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)
+            for _, entry in etree.iterparse(stream, events=('end',), tag=SITEMAP_ENTRY_TAGS):
+                loc = entry.findtext(SITEMAP_NS + 'loc') or entry.findtext('loc')
+                if loc:
+                    yield etree.QName(entry).localname == 'sitemap', loc.strip()
+                # Libera gli elementi già letti per mantenere la memoria costante
+                entry.clear()
+                while entry.getprevious() is not None:
+                    del entry.getparent()[0]
 
-    def _hash_content(self, content: bytes) -> str:
-        return hashlib.sha256(content).hexdigest()
+    def _is_document_url(self, url: str) -> bool:
+        return bool(self._ext_re.search(url))
 
     def _download_file(self, url: str, session: httpx.Client) -> Dict[str, Any]:
+        # Conditional GET for documents already downloaded in previous runs
+        cached = self._cache.get(url) if self._cache else None
+        if cached and not os.path.exists(os.path.join(self.output_path, cached['filename'])):
+            cached = None
+        headers = self._cache.conditional_headers(cached) if cached else {}
+        tmp_path = None
         try:
-            r = session.get(url, timeout=30)
-            r.raise_for_status()
-            content = r.content
-            content_hash = self._hash_content(content)
-            ext = os.path.splitext(url)[1].lower()
-            filename = f"{content_hash[:12]}{ext}"
-            filepath = os.path.join(self.output_path, filename)
-            with open(filepath, "wb") as f:
-                f.write(content)
-            metadata = {
-                'filename': filename,
-                'original_url': url,
-                'download_date': datetime.now().isoformat(),
-                'file_size': len(content),
-                'content_type': r.headers.get('content-type', ''),
-                'source_domain': urlparse(url).netloc,
-                'content_hash': content_hash
-            }
+            with session.stream('GET', url, timeout=30, headers=headers) as r:
+                if r.status_code == 304:
+                    self.logger.info(f"Non modificato: {cached['filename']} da {url}")
+                    return self._cache.to_metadata(cached)
+                r.raise_for_status()
+                h = hashlib.sha256()
+                size = 0
+                with tempfile.NamedTemporaryFile(dir=self.output_path, suffix='.part', delete=False) as tmp:
+                    tmp_path = tmp.name
+                    for chunk in r.iter_bytes(self.chunk_size):
+                        h.update(chunk)
+                        tmp.write(chunk)
+                        size += len(chunk)
+                content_hash = h.hexdigest()
+                ext = os.path.splitext(url)[1].lower()
+                filename = f"{content_hash[:12]}{ext}"
+                filepath = os.path.join(self.output_path, filename)
+                if os.path.exists(filepath):
+                    # Same content already on disk (mirror URL): the record points to the existing file
+                    self.logger.info(f"Contenuto duplicato: {filename} da {url}")
+                else:
+                    os.replace(tmp_path, filepath)
+                    tmp_path = None
+                metadata = {
+                    'filename': filename,
+                    'original_url': url,
+                    'download_date': datetime.now().isoformat(),
+                    'file_size': size,
+                    'content_type': r.headers.get('content-type', ''),
+                    'source_domain': urlparse(url).netloc,
+                    'content_hash': content_hash
+                }
+                if self._cache:
+                    self._cache.store(metadata, r.headers)
             self.logger.info(f"Scaricato: {filename} da {url}")
             return metadata
         except Exception as e:
             self.logger.error(f"Errore download {url}: {e}")
             return {}
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def collect(self) -> pd.DataFrame:
         all_metadata = []
@@ -76,15 +164,21 @@ class SitemapDocumentCollector(BaseCollector):
         for sitemap_url in self.sitemap_urls:
             urls = self._get_urls_from_sitemap(sitemap_url)
             all_urls.extend(urls)
-        doc_urls = [u for u in all_urls if self._is_document_url(u)]
+        # Deduplica gli URL presenti in più sitemap, mantenendo l'ordine
+        doc_urls = list(dict.fromkeys(u for u in all_urls if self._is_document_url(u)))
         self.logger.info(f"Trovati {len(doc_urls)} documenti nelle sitemap.")
         os.makedirs(self.output_path, exist_ok=True)
-        with httpx.Client(headers=self.headers, follow_redirects=True, http2=False) as session:
-            for url in doc_urls:
-                metadata = self._download_file(url, session)
-                if metadata:
-                    all_metadata.append(metadata)
-                time.sleep(self.sleep_time)
+        self._cache = DownloadCache(os.path.join(self.output_path, 'cache.db'))
+        try:
+            with httpx.Client(headers=self.headers, follow_redirects=True, http2=False) as session:
+                for url in doc_urls:
+                    metadata = self._download_file(url, session)
+                    if metadata:
+                        all_metadata.append(metadata)
+                    time.sleep(self.sleep_time)
+        finally:
+            self._cache.close()
+            self._cache = None
         if not all_metadata:
             return pd.DataFrame()
         df = pd.DataFrame(all_metadata)
@@ -92,7 +186,11 @@ class SitemapDocumentCollector(BaseCollector):
             self.output_path,
             f"sitemap_document_metadata_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         )
-        df.to_csv(metadata_file, index=False, encoding='utf-8')
+        pacsv.write_csv(
+            pa.Table.from_pandas(df, preserve_index=False),
+            metadata_file,
+            write_options=pacsv.WriteOptions(batch_size=64 << 10)
+        )
         return df
 
     def validate(self, data: pd.DataFrame) -> bool:
@@ -1,17 +1,27 @@
 import httpx
 import os
 import re
-import time
+import asyncio
+import atexit
+import csv
+import json
+import random
 import hashlib
-import xml.etree.ElementTree as ET
+import io
+import tempfile
+import time
 import logging
-from bs4 import BeautifulSoup
+from lxml import etree, html as lh
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Set
 from .base_collector import BaseCollector
 import pandas as pd
 
+METADATA_COLUMNS = ['filename', 'original_url', 'download_date', 'file_size',
+                    'content_hash', 'hash_algo', 'source_domain']
+SITEMAP_LOC_TAGS = ('{http://www.sitemaps.org/schemas/sitemap/0.9}loc', 'loc')
+
 class SmartDocumentFetcher(BaseCollector):
     """Collector avanzato per il download di documenti con gestione errori e Wayback Machine"""
     
@@ -20,9 +30,19 @@ class SmartDocumentFetcher(BaseCollector):
         self.sitemap_urls = config.get('sitemap_urls', [])
         self.indice_urls = config.get('indice_urls', [])
         self.allowed_extensions = config.get('allowed_extensions', ['.pdf', '.doc', '.docx'])
+        self._ext_tuple = tuple(ext.lower() for ext in self.allowed_extensions)
         self.sleep_time = config.get('sleep_time', 2)
         self.max_retries = config.get('max_retries', 3)
         self.retry_delay = config.get('retry_delay', 5)
+        self.concurrency = config.get('concurrency', 8)
+        # Intervallo minimo/massimo tra due richieste allo stesso host
+        self.min_delay = config.get('min_delay', self.sleep_time)
+        self.max_delay = config.get('max_delay', self.sleep_time)
+        self.output_path = config.get('output_path', 'data/documents/smart')
+        self.chunk_size = config.get('chunk_size', 64 * 1024)
+        # Algoritmo di hash (hashlib): sha256 usa OpenSSL, accelerato da SHA-NI dove disponibile
+        self.hash_algo = config.get('hash_algo', 'sha256')
+        hashlib.new(self.hash_algo)  # Fallisce subito se l'algoritmo non è supportato
         
         # Headers più realistici
         self.headers = {
@@ -38,53 +58,233 @@ class SmartDocumentFetcher(BaseCollector):
         # Crea directory output se non esiste
         os.makedirs(self.output_path, exist_ok=True)
         
+        # Indici persistenti dei documenti già scaricati: hash del contenuto e coppie ETag/Content-Length
+        self.hash_index_path = os.path.join(self.output_path, '.hashes.txt')
+        self.validator_index_path = os.path.join(self.output_path, '.etags.txt')
+        self.seen_hashes = self._load_index(self.hash_index_path)
+        self.seen_validators = self._load_index(self.validator_index_path)
+        
+        # Checkpoint degli URL completati per fonte, per riprendere le esecuzioni interrotte
+        self.checkpoint_path = os.path.join(self.output_path, '.checkpoint.json')
+        self.checkpoint_every = config.get('checkpoint_every', 20)
+        self.checkpoint = self._load_checkpoint()
+        self._done_urls = set().union(*self.checkpoint.values())
+        self._url_source: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._metadata_file = None
+        self._metadata_writer: Optional[csv.DictWriter] = None
+        self._checkpoint_pending = 0
+        atexit.register(self._flush_checkpoint)
+        
+        # Cache HTTP di sitemap e pagine indice (ETag/Last-Modified + corpo su disco)
+        self.cache_ttl = config.get('cache_ttl', 3600)
+        self.http_cache_dir = os.path.join(self.output_path, '.http_cache')
+        self.http_cache_path = os.path.join(self.http_cache_dir, 'index.json')
+        os.makedirs(self.http_cache_dir, exist_ok=True)
+        self.http_cache = self._load_http_cache()
+        
     def _is_document_url(self, url: str) -> bool:
         """Verifica se l'URL punta a un documento consentito"""
-        return any(url.lower().endswith(ext) for ext in self.allowed_extensions)
+        return url.lower().endswith(self._ext_tuple)
+        
+    def _new_hasher(self):
+        """Crea l'hash incrementale del contenuto per evitare duplicati"""
+        return hashlib.new(self.hash_algo)
         
-    def _hash_content(self, content: bytes) -> str:
-        """Genera hash del contenuto per evitare duplicati"""
-        return hashlib.sha256(content).hexdigest()
+    def _load_index(self, path: str) -> Set[str]:
+        """Carica un indice persistente (una voce per riga)"""
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'r', encoding='utf-8') as f:
+            return {line.rstrip('\n') for line in f if line.strip()}
+            
+    def _append_index(self, path: str, index: Set[str], key: str) -> None:
+        """Aggiunge una voce all'indice in memoria e su disco"""
+        if key in index:
+            return
+        index.add(key)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(key + '\n')
+            
+    def _load_checkpoint(self) -> Dict[str, Set[str]]:
+        """Carica il checkpoint: fonte (sitemap o pagina indice) → URL completati"""
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return {source: set(urls) for source, urls in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"[WARN] Checkpoint non leggibile, ripartenza da zero: {str(e)}")
+            return {}
+            
+    def _flush_checkpoint(self) -> None:
+        """Scrive il checkpoint su disco in modo atomico"""
+        if not self._checkpoint_pending:
+            return
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({source: sorted(urls) for source, urls in self.checkpoint.items()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self._checkpoint_pending = 0
         
-    def _save_file(self, content: bytes, url: str) -> Optional[Dict[str, Any]]:
-        """Salva il file e restituisce i metadata"""
+    def _mark_done(self, url: str) -> None:
+        """Registra un URL completato (salvato o già presente) nel checkpoint"""
+        if url in self._done_urls:
+            return
+        self._done_urls.add(url)
+        self.checkpoint.setdefault(self._url_source.get(url, ''), set()).add(url)
+        self._checkpoint_pending += 1
+        if self._checkpoint_pending >= self.checkpoint_every:
+            self._flush_checkpoint()
+            
+    def _load_http_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Carica l'indice della cache HTTP: URL → validatori e percorso del corpo"""
+        if not os.path.exists(self.http_cache_path):
+            return {}
         try:
-            content_hash = self._hash_content(content)
+            with open(self.http_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"[WARN] Cache HTTP non leggibile, verrà ricreata: {str(e)}")
+            return {}
+            
+    def _save_http_cache(self) -> None:
+        """Scrive l'indice della cache HTTP su disco"""
+        tmp_path = self.http_cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.http_cache, f)
+        os.replace(tmp_path, self.http_cache_path)
+        
+    async def _conditional_get(self, url: str, client: httpx.AsyncClient) -> Optional[bytes]:
+        """GET condizionale con cache su disco: restituisce il corpo (dalla rete o dalla cache)"""
+        entry = self.http_cache.get(url)
+        if entry and not os.path.exists(entry['body_path']):
+            entry = None
+            
+        # Voce ancora valida: nessuna richiesta di rete
+        if entry and time.time() - entry['fetched_at'] < self.cache_ttl:
+            self.logger.info(f"[CACHE] {url}")
+            with open(entry['body_path'], 'rb') as f:
+                return f.read()
+                
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+                
+        await self._throttle(url)
+        response = await client.get(url, headers=headers, timeout=30)
+        
+        if response.status_code == 304 and entry:
+            self.logger.info(f"[304] Non modificato: {url}")
+            entry['fetched_at'] = time.time()
+            with open(entry['body_path'], 'rb') as f:
+                return f.read()
+                
+        if response.status_code != 200:
+            self.logger.warning(f"[WARN] {url} → status {response.status_code}")
+            return None
+            
+        body_path = os.path.join(self.http_cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+        with open(body_path, 'wb') as f:
+            f.write(response.content)
+        self.http_cache[url] = {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'body_path': body_path,
+            'fetched_at': time.time()
+        }
+        return response.content
+        
+    def _validator_key(self, url: str, headers: httpx.Headers) -> Optional[str]:
+        """Chiave URL/ETag/Content-Length che identifica una risposta già vista"""
+        etag = headers.get('etag')
+        if not etag:
+            return None
+        # L'URL fa parte della chiave: ETag del tipo mtime-size (nginx) si ripetono tra documenti diversi
+        return f"{url}|{etag}|{headers.get('content-length', '')}"
+        
+    async def _save_response(self, response: httpx.Response, url: str,
+                             validator: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Salva il corpo della risposta a blocchi e restituisce i metadata"""
+        tmp_path = None
+        try:
+            # Scrive su file temporaneo calcolando l'hash durante il download
+            hasher = self._new_hasher()
+            with tempfile.NamedTemporaryFile(dir=self.output_path, suffix='.part', delete=False) as tmp:
+                tmp_path = tmp.name
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                file_size = tmp.tell()
+                
+            content_hash = hasher.hexdigest()
             ext = os.path.splitext(url)[1].lower()
             filename = f"{content_hash[:12]}{ext}"
             filepath = os.path.join(self.output_path, filename)
             
-            # Salva solo se non esiste già
-            if not os.path.exists(filepath):
-                with open(filepath, 'wb') as f:
-                    f.write(content)
+            # Duplicato solo se l'hash è nell'indice e il file è ancora su disco:
+            # il controllo sul disco serve solo quando l'indice (veloce) dà esito positivo
+            if not (content_hash in self.seen_hashes and os.path.exists(filepath)):
+                os.replace(tmp_path, filepath)
+                tmp_path = None
                 self.logger.info(f"[OK] Salvato: {filename}")
+                self._append_index(self.hash_index_path, self.seen_hashes, content_hash)
+                if validator:
+                    self._append_index(self.validator_index_path, self.seen_validators, validator)
+                self._mark_done(url)
                 
-                return {
+                metadata = {
                     'filename': filename,
                     'original_url': url,
                     'download_date': datetime.now().isoformat(),
-                    'file_size': len(content),
+                    'file_size': file_size,
                     'content_hash': content_hash,
+                    'hash_algo': self.hash_algo,
                     'source_domain': urlparse(url).netloc
                 }
+                # Scrive subito la riga: i metadata sopravvivono a un'interruzione
+                if self._metadata_writer:
+                    self._metadata_writer.writerow(metadata)
+                    self._metadata_file.flush()
+                return metadata
             else:
                 self.logger.info(f"[SKIP] Duplicato: {filename}")
+                self._append_index(self.hash_index_path, self.seen_hashes, content_hash)
+                self._mark_done(url)
                 return None
                 
         except Exception as e:
             self.logger.error(f"[ERROR] Errore salvataggio {url}: {str(e)}")
             return None
             
-    def _try_wayback_machine(self, url: str) -> Optional[Dict[str, Any]]:
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            
+    async def _throttle(self, url: str) -> None:
+        """Attende il turno dell'host: host diversi procedono in parallelo"""
+        host = urlparse(url).netloc
+        async with self._host_locks.setdefault(host, asyncio.Lock()):
+            loop = asyncio.get_running_loop()
+            delay = self._host_next_ok.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._host_next_ok[host] = loop.time() + random.uniform(self.min_delay, self.max_delay)
+            
+    async def _try_wayback_machine(self, url: str, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
         """Prova a recuperare il documento dalla Wayback Machine"""
         try:
             archive_url = f"https://web.archive.org/web/{url}"
-            with httpx.Client(headers=self.headers, follow_redirects=True, timeout=30) as session:
-                response = session.get(archive_url)
+            await self._throttle(archive_url)
+            async with client.stream('GET', archive_url) as response:
                 if response.status_code == 200:
                     self.logger.info(f"[WB] Recuperato da Wayback: {url}")
-                    return self._save_file(response.content, url)
+                    return await self._save_response(response, url)
                 else:
                     self.logger.warning(f"[WB] Non trovato in Wayback: {url}")
                     return None
@@ -93,112 +293,175 @@ class SmartDocumentFetcher(BaseCollector):
             self.logger.error(f"[WB] Errore Wayback {url}: {str(e)}")
             return None
             
-    def _download_with_retry(self, url: str, session: httpx.Client) -> Optional[Dict[str, Any]]:
+    async def _download_with_retry(self, url: str, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
         """Scarica un documento con retry e fallback su Wayback"""
         for attempt in range(self.max_retries):
             try:
-                response = session.get(url, timeout=30)
-                
-                if response.status_code == 200:
-                    return self._save_file(response.content, url)
-                    
-                elif response.status_code in [403, 404, 410]:
-                    self.logger.warning(f"[RETRY] {url} → {response.status_code}")
-                    if attempt == self.max_retries - 1:
-                        return self._try_wayback_machine(url)
+                async with client.stream('GET', url, timeout=30) as response:
+                    if response.status_code == 200:
+                        # Gli header arrivano prima del corpo: salta i documenti già noti
+                        validator = self._validator_key(url, response.headers)
+                        if validator and validator in self.seen_validators:
+                            self.logger.info(f"[SKIP] Già scaricato: {url}")
+                            self._mark_done(url)
+                            return None
+                        return await self._save_response(response, url, validator)
                         
-                else:
-                    self.logger.warning(f"[WARN] {url} → status {response.status_code}")
+                    elif response.status_code in [403, 404, 410]:
+                        self.logger.warning(f"[RETRY] {url} → {response.status_code}")
+                        if attempt == self.max_retries - 1:
+                            return await self._try_wayback_machine(url, client)
+                            
+                    else:
+                        self.logger.warning(f"[WARN] {url} → status {response.status_code}")
                     
             except httpx.RequestError as e:
                 self.logger.error(f"[FAIL] {url} → {str(e)}")
                 if attempt == self.max_retries - 1:
-                    return self._try_wayback_machine(url)
+                    return await self._try_wayback_machine(url, client)
                     
-            time.sleep(self.retry_delay * (attempt + 1))
+            await asyncio.sleep(self.retry_delay * (attempt + 1))
             
         return None
         
-    def _extract_from_html(self, url: str, session: httpx.Client) -> List[Dict[str, Any]]:
-        """Estrae e scarica documenti da una pagina HTML"""
-        metadata_list = []
+    async def _adownload(self, url: str, client: httpx.AsyncClient,
+                         sem: asyncio.BoundedSemaphore) -> Optional[Dict[str, Any]]:
+        """Scarica un documento rispettando il limite di concorrenza"""
+        await self._throttle(url)
+        async with sem:
+            return await self._download_with_retry(url, client)
+        
+    async def _extract_from_html(self, url: str, client: httpx.AsyncClient) -> List[str]:
+        """Estrae i link a documenti da una pagina HTML"""
         try:
-            response = session.get(url, timeout=30)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'lxml')
-                links = [urljoin(url, a['href']) for a in soup.find_all('a', href=True)]
-                
-                for link in links:
-                    if self._is_document_url(link):
-                        time.sleep(self.sleep_time)
-                        metadata = self._download_with_retry(link, session)
-                        if metadata:
-                            metadata_list.append(metadata)
+            content = await self._conditional_get(url, client)
+            if content:
+                doc = lh.fromstring(content)
+                links = [urljoin(url, href) for href in doc.xpath('//a/@href')]
+                return [link for link in links if self._is_document_url(link)]
                             
         except Exception as e:
             self.logger.error(f"[ERROR] {url} → {str(e)}")
             
-        return metadata_list
+        return []
         
-    def _extract_from_sitemap(self, sitemap_url: str, session: httpx.Client) -> List[Dict[str, Any]]:
-        """Estrae e scarica documenti da una sitemap XML"""
-        metadata_list = []
+    async def _extract_from_sitemap(self, sitemap_url: str, client: httpx.AsyncClient) -> AsyncIterator[str]:
+        """Estrae in streaming i link a documenti da una sitemap XML"""
         try:
-            response = session.get(sitemap_url, timeout=30)
-            if response.status_code == 200:
-                root = ET.fromstring(response.text)
-                ns = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-                urls = [el.text for el in root.findall('.//ns:loc', ns)]
-                
-                for url in urls:
-                    if self._is_document_url(url):
-                        time.sleep(self.sleep_time)
-                        metadata = self._download_with_retry(url, session)
-                        if metadata:
-                            metadata_list.append(metadata)
-                            
+            content = await self._conditional_get(sitemap_url, client)
+            if not content:
+                return
+            for _, el in etree.iterparse(io.BytesIO(content), events=('end',), tag=SITEMAP_LOC_TAGS):
+                url = (el.text or '').strip()
+                # Libera gli elementi già letti per mantenere la memoria costante
+                el.clear()
+                parent = el.getparent()
+                while parent is not None and parent.getprevious() is not None:
+                    del parent.getparent()[0]
+                if url and self._is_document_url(url):
+                    yield url
+                    
         except Exception as e:
             self.logger.error(f"[ERROR] Sitemap {sitemap_url} → {str(e)}")
             
-        return metadata_list
+    def _schedule(self, url: str, source: str, client: httpx.AsyncClient,
+                  sem: asyncio.BoundedSemaphore) -> None:
+        """Avvia il download di un URL appena scoperto, se nuovo e non già completato"""
+        if url in self._url_source:
+            return
+        self._url_source[url] = source
+        if url in self._done_urls:
+            return
+        self._tasks[url] = asyncio.create_task(self._adownload(url, client, sem))
         
-    def collect(self) -> pd.DataFrame:
-        """Raccoglie documenti da tutte le fonti configurate"""
-        all_metadata = []
+    async def _process_sitemap(self, sitemap_url: str, client: httpx.AsyncClient,
+                               sem: asyncio.BoundedSemaphore) -> None:
+        """Avvia i download man mano che i link emergono dalla sitemap"""
+        self.logger.info(f"Processando sitemap: {sitemap_url}")
+        async for url in self._extract_from_sitemap(sitemap_url, client):
+            self._schedule(url, sitemap_url, client, sem)
+            
+    async def _process_indice(self, indice_url: str, client: httpx.AsyncClient,
+                              sem: asyncio.BoundedSemaphore) -> None:
+        """Avvia i download dei link trovati in una pagina indice"""
+        self.logger.info(f"Processando pagina indice: {indice_url}")
+        for url in await self._extract_from_html(indice_url, client):
+            self._schedule(url, indice_url, client, sem)
+            
+    async def _acollect(self) -> int:
+        """Raccoglie i link da tutte le fonti in parallelo e scarica i documenti man mano"""
+        sem = asyncio.BoundedSemaphore(self.concurrency)
         
-        with httpx.Client(
+        async with httpx.AsyncClient(
             headers=self.headers,
             follow_redirects=True,
             timeout=30,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
             http2=False  # Disabilita HTTP/2 per evitare problemi
-        ) as session:
+        ) as client:
+            # URL documento → fonte da cui proviene (la prima che lo elenca) e download avviati
+            self._url_source = {}
+            self._tasks = {}
+            # Lock e turni per host creati a ogni esecuzione: legati all'event loop di asyncio.run
+            self._host_locks: Dict[str, asyncio.Lock] = {}
+            self._host_next_ok: Dict[str, float] = {}
+            
+            try:
+                # Sitemap e pagine indice in parallelo: i download partono durante l'analisi
+                sources = [*self.sitemap_urls, *self.indice_urls]
+                source_results = await asyncio.gather(
+                    *(self._process_sitemap(url, client, sem) for url in self.sitemap_urls),
+                    *(self._process_indice(url, client, sem) for url in self.indice_urls),
+                    return_exceptions=True
+                )
+            finally:
+                self._save_http_cache()
             
-            # Processa sitemap
-            for sitemap_url in self.sitemap_urls:
-                self.logger.info(f"Processando sitemap: {sitemap_url}")
-                metadata_list = self._extract_from_sitemap(sitemap_url, session)
-                all_metadata.extend(metadata_list)
+            for source, result in zip(sources, source_results):
+                if isinstance(result, BaseException):
+                    self.logger.error(f"[ERROR] Fonte {source} → {str(result)}")
                 
-            # Processa pagine indice
-            for indice_url in self.indice_urls:
-                self.logger.info(f"Processando pagina indice: {indice_url}")
-                metadata_list = self._extract_from_html(indice_url, session)
-                all_metadata.extend(metadata_list)
+            # Gli URL già completati in esecuzioni precedenti non vengono riscaricati
+            skipped = len(self._url_source) - len(self._tasks)
+            if skipped:
+                self.logger.info(f"[RESUME] {skipped} documenti già completati, {len(self._tasks)} da scaricare")
                 
-        # Converti in DataFrame
-        if not all_metadata:
-            return pd.DataFrame()
+            try:
+                results = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            finally:
+                self._flush_checkpoint()
             
-        df = pd.DataFrame(all_metadata)
+        saved = 0
+        for url, result in zip(self._tasks, results):
+            if isinstance(result, BaseException):
+                self.logger.error(f"[ERROR] {url} → {str(result)}")
+            elif result:
+                saved += 1
+        return saved
         
-        # Salva metadata
+    def collect(self) -> pd.DataFrame:
+        """Raccoglie documenti da tutte le fonti configurate"""
+        # I metadata vengono scritti riga per riga durante i download
         metadata_file = os.path.join(
             self.output_path,
             f"document_metadata_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         )
-        df.to_csv(metadata_file, index=False, encoding='utf-8')
-        
-        return df
+        with open(metadata_file, 'w', newline='', encoding='utf-8') as f:
+            self._metadata_file = f
+            self._metadata_writer = csv.DictWriter(f, fieldnames=METADATA_COLUMNS)
+            self._metadata_writer.writeheader()
+            try:
+                saved = asyncio.run(self._acollect())
+            finally:
+                self._metadata_writer = None
+                self._metadata_file = None
+                
+        # Nessun documento nuovo: non lascia un file di soli header
+        if not saved:
+            os.remove(metadata_file)
+            return pd.DataFrame()
+            
+        return pd.read_csv(metadata_file, dtype={'filename': str, 'content_hash': str}, encoding='utf-8')
         
     def validate(self, data: pd.DataFrame) -> bool:
         """Valida i dati raccolti"""
@@ -1,7 +1,10 @@
 import tweepy
+import tweepy.asynchronous as ta
+import aiohttp
 import pandas as pd
 from typing import Dict, Any, List
 from .base_collector import BaseCollector
+import asyncio
 import logging
 from datetime import datetime
 import time
@@ -15,6 +18,8 @@ class SocialMediaCollector(BaseCollector):
         self.api_keys = config.get('api_keys', {})
         self.search_terms = config.get('search_terms', [])
         self.max_results = config.get('max_results', 100)
+        self.concurrency = config.get('concurrency', 5)
+        self.max_retries = config.get('max_retries', 5)
         
     def collect(self) -> pd.DataFrame:
         """Collect data from social media platforms"""
@@ -32,51 +37,89 @@ class SocialMediaCollector(BaseCollector):
         required_columns = self.config.get('required_columns', [])
         return all(col in data.columns for col in required_columns)
     
-    def _collect_twitter(self) -> pd.DataFrame:
-        """Collect data from Twitter"""
-        try:
-            # Initialize Twitter API client
-            client = tweepy.Client(
-                bearer_token=self.api_keys.get('bearer_token'),
-                consumer_key=self.api_keys.get('api_key'),
-                consumer_secret=self.api_keys.get('api_secret'),
-                access_token=self.api_keys.get('access_token'),
-                access_token_secret=self.api_keys.get('access_token_secret')
-            )
-            
-            all_tweets = []
-            
-            for term in self.search_terms:
+    async def _search(self, term: str, client: ta.AsyncClient,
+                      sem: asyncio.BoundedSemaphore) -> List[tweepy.Tweet]:
+        """Search recent tweets for a term, backing off on rate limits"""
+        tweets: List[tweepy.Tweet] = []
+        next_token = None
+        async with sem:
+            for attempt in range(self.max_retries):
                 try:
-                    # Search tweets
-                    tweets = client.search_recent_tweets(
+                    # After a rate limit, resume from the last page received instead of page one
+                    paginator = ta.AsyncPaginator(
+                        client.search_recent_tweets,
                         query=term,
-                        max_results=self.max_results,
-                        tweet_fields=['created_at', 'public_metrics', 'lang']
+                        max_results=min(self.max_results, 100),
+                        tweet_fields=['created_at', 'public_metrics', 'lang'],
+                        pagination_token=next_token
                     )
+                    async for response in paginator:
+                        tweets.extend(response.data or [])
+                        next_token = response.meta.get('next_token')
+                        if len(tweets) >= self.max_results or next_token is None:
+                            break
+                    return tweets[:self.max_results]
+                    
+                except tweepy.TooManyRequests as e:
+                    # Wait for the window reset if the API reports it, otherwise back off exponentially
+                    reset = e.response.headers.get('x-rate-limit-reset')
+                    delay = max(int(reset) - time.time(), 1) if reset else 2 ** attempt
+                    self.logger.warning(f"Rate limited searching {term}, retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
                     
-                    if tweets.data:
-                        for tweet in tweets.data:
-                            tweet_data = {
-                                'text': tweet.text,
-                                'created_at': tweet.created_at,
-                                'id': tweet.id,
-                                'lang': tweet.lang,
-                                'retweet_count': tweet.public_metrics['retweet_count'],
-                                'reply_count': tweet.public_metrics['reply_count'],
-                                'like_count': tweet.public_metrics['like_count'],
-                                'quote_count': tweet.public_metrics['quote_count'],
-                                'search_term': term
-                            }
-                            all_tweets.append(tweet_data)
-                            
                 except Exception as e:
                     self.logger.error(f"Error searching tweets for term {term}: {str(e)}")
+                    return tweets
                     
-                # Add delay to avoid rate limits
-                time.sleep(1)
+            self.logger.error(f"Rate limit retries exhausted for term {term}")
+            return tweets
+    
+    async def _search_all(self) -> List[List[tweepy.Tweet]]:
+        """Search all terms concurrently"""
+        client = ta.AsyncClient(
+            bearer_token=self.api_keys.get('bearer_token'),
+            consumer_key=self.api_keys.get('api_key'),
+            consumer_secret=self.api_keys.get('api_secret'),
+            access_token=self.api_keys.get('access_token'),
+            access_token_secret=self.api_keys.get('access_token_secret')
+        )
+        # One shared session for every request, closed when the searches are done
+        client.session = aiohttp.ClientSession()
+        try:
+            sem = asyncio.BoundedSemaphore(self.concurrency)
+            return await asyncio.gather(*[self._search(term, client, sem) for term in self.search_terms])
+        finally:
+            await client.session.close()
+    
+    def _collect_twitter(self) -> pd.DataFrame:
+        """Collect data from Twitter"""
+        try:
+            results = asyncio.run(self._search_all())
+            
+            # Build the frame column-wise rather than from one dict per tweet
+            columns: Dict[str, List[Any]] = {
+                'text': [], 'created_at': [], 'id': [], 'lang': [],
+                'retweet_count': [], 'reply_count': [], 'like_count': [], 'quote_count': [],
+                'search_term': []
+            }
+            
+            for term, tweets in zip(self.search_terms, results):
+                for tweet in tweets:
+                    metrics = tweet.public_metrics
+                    columns['text'].append(tweet.text)
+                    columns['created_at'].append(tweet.created_at)
+                    columns['id'].append(tweet.id)
+                    columns['lang'].append(tweet.lang)
+                    columns['retweet_count'].append(metrics['retweet_count'])
+                    columns['reply_count'].append(metrics['reply_count'])
+                    columns['like_count'].append(metrics['like_count'])
+                    columns['quote_count'].append(metrics['quote_count'])
+                columns['search_term'].extend([term] * len(tweets))
+                
+            if not columns['id']:
+                return pd.DataFrame()
                 
-            return pd.DataFrame(all_tweets)
+            return pd.DataFrame(columns)
             
         except Exception as e:
             self.logger.error(f"Error initializing Twitter client: {str(e)}")
@@ -89,10 +132,10 @@ class SocialMediaCollector(BaseCollector):
         
         # Clean text data
         if 'text' in data.columns:
-            data['text'] = data['text'].str.strip()
+            data['text'] = data['text'].astype('string[pyarrow]').str.strip()
             
         # Convert dates to datetime
         if 'created_at' in data.columns:
-            data['created_at'] = pd.to_datetime(data['created_at'])
+            data['created_at'] = pd.to_datetime(data['created_at'], format='ISO8601', utc=True, cache=True)
             
         return data 
\ No newline at end of file
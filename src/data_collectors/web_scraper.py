@@ -1,16 +1,42 @@
-import requests
+import httpx
 from bs4 import BeautifulSoup
+from lxml import etree, html as lh
 import pandas as pd
 import time
 import random
+import asyncio
 import logging
-from typing import Dict, Any, List
-import concurrent.futures
-from urllib.parse import urljoin
+from typing import Dict, Any, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlparse
 import re
 from fake_useragent import UserAgent
-import cloudscraper
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+_URL_RE = re.compile(r'^https?://')
+_SKIP_EXT_RE = re.compile(r'\.(pdf|doc|docx|xls|xlsx|zip|rar)$', re.I)
+
+_HEADERS_TEMPLATE = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+}
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
 
 class WebScraper:
     """Web scraper for collecting data from multiple sources"""
@@ -19,40 +45,69 @@ class WebScraper:
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.ua = UserAgent()
-        self.scraper = cloudscraper.create_scraper(
-            browser={
-                'browser': 'chrome',
-                'platform': 'windows',
-                'mobile': False
-            }
-        )
+        # Draw the user agents once; requests pick from this pool
+        self._ua_pool = [self.ua.random for _ in range(config.get('ua_pool_size', 32))]
+        # Shared connection pool, open for the duration of crawl()
+        self.client: Optional[httpx.AsyncClient] = None
+        self.http2 = config.get('http2', False)
+        # Crawl limits: link depth from the start URLs, total page budget and concurrency
+        self.max_depth = config.get('max_depth', 2)
+        self.max_pages = config.get('max_pages', 200)
+        self.max_links_per_page = config.get('max_links_per_page', 5)
+        self.max_workers = config.get('max_workers', 5)
+        self.per_host_concurrency = config.get('per_host_concurrency', 2)
         
     def _get_headers(self) -> Dict[str, str]:
         """Generate random headers"""
-        return {
-            'User-Agent': self.ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0',
-        }
+        return {**_HEADERS_TEMPLATE, 'User-Agent': random.choice(self._ua_pool)}
         
-    def _make_request(self, url: str, retries: int = 3) -> requests.Response:
-        """Make HTTP request with retries and random delays"""
+    async def _wait_for_host(self, host: str) -> None:
+        """Sleep only if the host's rate-limit budget is exhausted"""
+        state = self._host_state.get(host)
+        if state and state['remaining'] <= 1:
+            delay = state['reset_ts'] - time.time()
+            if delay > 0:
+                self.logger.info(f"Rate limit reached for {host}, waiting {delay:.1f}s")
+                await asyncio.sleep(delay)
+                
+    def _update_host_state(self, host: str, response: httpx.Response) -> None:
+        """Record X-RateLimit-Remaining / X-RateLimit-Reset from a response"""
+        remaining = response.headers.get('x-ratelimit-remaining')
+        reset = response.headers.get('x-ratelimit-reset')
+        if remaining is None:
+            return
+        try:
+            reset_value = float(reset) if reset else 60.0
+            # Reset is either an epoch timestamp or a number of seconds from now
+            reset_ts = reset_value if reset_value > 1e9 else time.time() + reset_value
+            self._host_state[host] = {'remaining': float(remaining), 'reset_ts': reset_ts}
+        except ValueError:
+            pass
+            
+    async def _make_request(self, url: str, retries: int = 3) -> httpx.Response:
+        """Make HTTP request with retries and header-driven backoff"""
+        host = urlparse(url).netloc
         for i in range(retries):
+            rate_limited = False
             try:
-                # Random delay between requests
-                time.sleep(random.uniform(1, 3))
+                await self._wait_for_host(host)
                 
                 # Make request with rotating headers
-                response = self.scraper.get(
+                response = await self.client.get(
                     url,
                     headers=self._get_headers(),
                     timeout=30
                 )
+                self._update_host_state(host, response)
+                
+                if response.status_code in (429, 503):
+                    # Honour Retry-After, otherwise back off exponentially with jitter
+                    delay = _parse_retry_after(response.headers.get('retry-after'))
+                    if delay is None:
+                        delay = 2 ** i + random.uniform(0, 1)
+                    self._host_state[host] = {'remaining': 0, 'reset_ts': time.time() + delay}
+                    rate_limited = True
+                    
                 response.raise_for_status()
                 return response
                 
@@ -60,17 +115,24 @@ class WebScraper:
                 self.logger.warning(f"Attempt {i+1} failed for {url}: {str(e)}")
                 if i == retries - 1:
                     raise
-                time.sleep(random.uniform(2, 5))
+                # After a 429/503 the wait happens in _wait_for_host on the next attempt
+                if not rate_limited:
+                    await asyncio.sleep(2 ** i + random.uniform(0, 1))
                 
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> List[str]:
+    def _extract_links(self, content: bytes, base_url: str) -> List[str]:
         """Extract all relevant links from page"""
         links = []
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+        try:
+            tree = lh.fromstring(content)
+        except etree.ParserError:
+            # Empty or whitespace-only body: no links, but the page data is still kept
+            return links
+        # Anchors only need their href: a plain lxml XPath avoids building BeautifulSoup objects
+        for href in tree.xpath('//a/@href'):
             # Convert relative URLs to absolute
             full_url = urljoin(base_url, href)
             # Filter out non-HTML links and external domains
-            if re.match(r'^https?://', full_url) and not re.match(r'\.(pdf|doc|docx|xls|xlsx|zip|rar)$', full_url):
+            if _URL_RE.match(full_url) and not _SKIP_EXT_RE.search(full_url):
                 links.append(full_url)
         return list(set(links))
         
@@ -114,49 +176,85 @@ class WebScraper:
         
         return data
         
-    def _scrape_page(self, url: str) -> List[Dict[str, Any]]:
-        """Scrape a single page"""
+    async def _scrape_page(self, url: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Scrape a single page, returning its items and outgoing links"""
         try:
-            response = self._make_request(url)
+            host = urlparse(url).netloc
+            async with self._host_sems.setdefault(host, asyncio.Semaphore(self.per_host_concurrency)):
+                response = await self._make_request(url)
             soup = BeautifulSoup(response.text, 'html.parser')
             
-            # Extract data
+            # Extract data and links
             data = self._extract_data(soup, url)
-            
-            # Extract and follow links
-            links = self._extract_links(soup, url)
-            for link in links[:5]:  # Limit to first 5 links to avoid infinite crawling
-                try:
-                    sub_data = self._scrape_page(link)
-                    data.extend(sub_data)
-                except Exception as e:
-                    self.logger.warning(f"Error scraping {link}: {str(e)}")
-            
-            return data
+            links = self._extract_links(response.content, url)
+            return data, links
             
         except Exception as e:
             self.logger.error(f"Error scraping {url}: {str(e)}")
-            return []
+            return [], []
+            
+    async def _worker(self, queue: asyncio.Queue, visited: Set[str],
+                      all_data: List[Dict[str, Any]]) -> None:
+        """Take pages off the crawl queue and enqueue the unseen links they contain"""
+        while True:
+            url, depth = await queue.get()
+            try:
+                data, links = await self._scrape_page(url)
+                all_data.extend(data)
+                if depth < self.max_depth:
+                    for link in links[:self.max_links_per_page]:
+                        if link not in visited and len(visited) < self.max_pages:
+                            visited.add(link)
+                            queue.put_nowait((link, depth + 1))
+            finally:
+                queue.task_done()
+                
+    async def close(self) -> None:
+        """Close the shared HTTP client"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            
+    async def crawl(self) -> List[Dict[str, Any]]:
+        """Breadth-first crawl from the configured URLs"""
+        all_data: List[Dict[str, Any]] = []
+        visited: Set[str] = set()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        for url in self.config['urls']:
+            if url not in visited:
+                visited.add(url)
+                queue.put_nowait((url, 0))
+                
+        # Per-host primitives belong to this event loop, so they are rebuilt on every crawl
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        # Rate-limit state per host: requests remaining and when the window resets
+        self._host_state: Dict[str, Dict[str, float]] = {}
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=128, max_keepalive_connections=64),
+            http2=self.http2
+        )
+        workers = [
+            asyncio.create_task(self._worker(queue, visited, all_data))
+            for _ in range(self.max_workers)
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.close()
+            
+        self.logger.info(f"Crawled {len(visited)} pages, {len(all_data)} items")
+        return all_data
             
     def run(self) -> pd.DataFrame:
         """Run the scraper on all configured URLs"""
-        all_data = []
+        all_data = asyncio.run(self.crawl())
         
-        # Use ThreadPoolExecutor for parallel scraping
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_url = {
-                executor.submit(self._scrape_page, url): url 
-                for url in self.config['urls']
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_url):
-                url = future_to_url[future]
-                try:
-                    data = future.result()
-                    all_data.extend(data)
-                except Exception as e:
-                    self.logger.error(f"Error processing {url}: {str(e)}")
-                    
         # Convert to DataFrame
         df = pd.DataFrame(all_data)
         
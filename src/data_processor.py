@@ -1,19 +1,55 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from typing import Dict, List, Optional
 from pathlib import Path
+from functools import lru_cache
+import hashlib
+import inspect
 import logging
 from datetime import datetime
 
+DATE_COLUMNS = ['Starting Year', 'End/Extension Year']
+BOOL_COLUMNS = ['Ended mission', 'Coop_UN', 'Coop_NATO', 'Coop_ASEAN', 'Coop_AU']
+NUMERIC_COLUMNS = ['Length (months)', 'Number of EU States at Time of Launch',
+                   'Peak Number of EU States', 'Proportional Number of States',
+                   'Absolute Recorded Maximum Personnel']
+TEXT_COLUMNS = ['Mission Name', 'Type', 'Notes']
+BOOL_MAPPER = {'Yes': True, 'No': False, 'yes': True, 'no': False, 1: True, 0: False}
+
+# Chiave dei metadati Parquet con l'impronta della logica di conversione
+PARQUET_FINGERPRINT_KEY = b'mida_conversion'
+
+@lru_cache(maxsize=1)
+def _conversion_fingerprint() -> str:
+    """Impronta di colonne e codice di conversione: se cambiano, la cache Parquet non è più valida."""
+    parts = [repr((DATE_COLUMNS, BOOL_COLUMNS, NUMERIC_COLUMNS, TEXT_COLUMNS, BOOL_MAPPER))]
+    parts += [inspect.getsource(method) for method in
+              (DataProcessor._convert_data_types, DataProcessor._stringify_mixed_columns)]
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
 class DataProcessor:
     def __init__(self, excel_path: str):
         self.excel_path = Path(excel_path)
         self.df = None
+        self._name_index: Optional[Dict[str, List]] = None
         self.logger = logging.getLogger(__name__)
         
     def load_data(self) -> None:
         """Carica il file Excel e pulisce la struttura iniziale."""
         try:
+            self._name_index = None
+            
+            # Usa la copia Parquet già convertita se è più recente del file Excel
+            parquet_path = self.excel_path.with_suffix('.parquet')
+            if (parquet_path.exists()
+                    and parquet_path.stat().st_mtime >= self.excel_path.stat().st_mtime
+                    and self._read_fingerprint(parquet_path) == _conversion_fingerprint()):
+                self.df = pd.read_parquet(parquet_path, engine='pyarrow')
+                self.logger.info(f"Dati caricati dalla cache Parquet: {len(self.df)} righe")
+                return
+            
             # Leggi il file Excel saltando la prima riga (codici)
             self.df = pd.read_excel(self.excel_path, skiprows=1)
             
@@ -22,6 +58,7 @@ class DataProcessor:
             
             # Converti i tipi di dati
             self._convert_data_types()
+            self._write_parquet(self.df, parquet_path)
             
             self.logger.info(f"File Excel caricato con successo: {len(self.df)} righe")
         except Exception as e:
@@ -32,54 +69,62 @@ class DataProcessor:
         """Converte i tipi di dati delle colonne."""
         try:
             # Converti date
-            date_columns = ['Starting Year', 'End/Extension Year']
-            for col in date_columns:
-                if col in self.df.columns:
-                    # Prima prova a convertire direttamente
-                    try:
-                        self.df[col] = pd.to_datetime(self.df[col], errors='coerce')
-                    except:
-                        # Se fallisce, prova a estrarre l'anno
-                        self.df[col] = pd.to_datetime(self.df[col].astype(str).str.extract('(\d{4})')[0], format='%Y', errors='coerce')
+            date_cols = [c for c in DATE_COLUMNS if c in self.df.columns]
+            if date_cols:
+                self.df[date_cols] = self.df[date_cols].apply(
+                    pd.to_datetime, errors='coerce', format='mixed', cache=True
+                )
             
-            # Converti booleani
-            bool_columns = ['Ended mission', 'Coop_UN', 'Coop_NATO', 'Coop_ASEAN', 'Coop_AU']
-            for col in bool_columns:
-                if col in self.df.columns:
-                    self.df[col] = self.df[col].map({'Yes': True, 'No': False, 'yes': True, 'no': False, 1: True, 0: False})
-                    # Converti i valori mancanti in False
-                    self.df[col] = self.df[col].fillna(False)
+            # Converti booleani (i valori mancanti diventano False)
+            bool_cols = [c for c in BOOL_COLUMNS if c in self.df.columns]
+            if bool_cols:
+                self.df[bool_cols] = self.df[bool_cols].apply(
+                    lambda s: s.map(BOOL_MAPPER).fillna(False)
+                ).astype(bool)
             
-            # Converti numerici
-            numeric_columns = ['Length (months)', 'Number of EU States at Time of Launch',
-                             'Peak Number of EU States', 'Proportional Number of States',
-                             'Absolute Recorded Maximum Personnel']
-            for col in numeric_columns:
-                if col in self.df.columns:
-                    # Rimuovi eventuali caratteri non numerici
-                    self.df[col] = self.df[col].astype(str).str.replace(r'[^\d.]', '', regex=True)
-                    self.df[col] = pd.to_numeric(self.df[col], errors='coerce')
+            # Converti numerici rimuovendo eventuali caratteri non numerici
+            num_cols = [c for c in NUMERIC_COLUMNS if c in self.df.columns]
+            if num_cols:
+                self.df[num_cols] = self.df[num_cols].replace(r'[^\d.]', '', regex=True).apply(
+                    pd.to_numeric, errors='coerce'
+                )
             
-            # Converti testo
-            text_columns = ['Mission Name', 'Type', 'Notes']
-            for col in text_columns:
-                if col in self.df.columns:
-                    self.df[col] = self.df[col].astype(str).str.strip()
-                    # Sostituisci 'nan' con stringa vuota
-                    self.df[col] = self.df[col].replace('nan', '')
+            # Converti testo, sostituendo 'nan' con stringa vuota
+            text_cols = [c for c in TEXT_COLUMNS if c in self.df.columns]
+            if text_cols:
+                self.df[text_cols] = self.df[text_cols].apply(
+                    lambda s: s.astype(str).str.strip().replace('nan', '')
+                )
+            
+            self._stringify_mixed_columns()
             
         except Exception as e:
             self.logger.error(f"Errore nella conversione dei tipi di dati: {str(e)}")
             raise
     
+    def _stringify_mixed_columns(self) -> None:
+        """Porta a testo le colonne object rimaste (es. interi e stringhe mescolati), non scrivibili in Parquet."""
+        object_cols = self.df.columns[self.df.dtypes == object]
+        if len(object_cols):
+            self.df[object_cols] = self.df[object_cols].astype('string')
+    
+    def _find_mission(self, mission_name: str) -> List:
+        """Restituisce le etichette di riga della missione (case insensitive)."""
+        if self._name_index is None:
+            self._name_index = {}
+            for label, name in zip(self.df.index, self.df['Mission Name']):
+                if isinstance(name, str):
+                    self._name_index.setdefault(name.lower(), []).append(label)
+        return self._name_index.get(mission_name.lower(), [])
+    
     def add_mission_data(self, mission_name: str, new_data: Dict) -> None:
         """Aggiunge o aggiorna i dati di una missione specifica."""
         if self.df is None:
             raise ValueError("Devi prima caricare i dati con load_data()")
         
         # Cerca la missione (case insensitive)
-        mask = self.df['Mission Name'].str.lower() == mission_name.lower()
-        if not any(mask):
+        rows = self._find_mission(mission_name)
+        if not rows:
             self.logger.warning(f"Missione non trovata: {mission_name}")
             return
         
@@ -101,26 +146,56 @@ class DataProcessor:
                         self.logger.warning(f"Impossibile convertire {value} in numero per la colonna {key}")
                         continue
                 
-                self.df.loc[mask, key] = value
+                self.df.loc[rows, key] = value
+                if key == 'Mission Name':
+                    self._name_index = None
+    
+    def _read_fingerprint(self, parquet_path: Path) -> Optional[str]:
+        """Legge dai metadati Parquet l'impronta della conversione con cui è stato scritto il file."""
+        try:
+            metadata = pq.read_schema(parquet_path).metadata or {}
+        except Exception:
+            return None
+        value = metadata.get(PARQUET_FINGERPRINT_KEY)
+        return value.decode('utf-8') if value else None
+    
+    def _write_parquet(self, df: pd.DataFrame, parquet_path: Path) -> None:
+        """Scrive la copia Parquet dei dati (zstd); un errore non blocca il flusso."""
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                PARQUET_FINGERPRINT_KEY: _conversion_fingerprint().encode('utf-8')
+            })
+            pq.write_table(table, parquet_path, compression='zstd', use_dictionary=True)
+        except Exception as e:
+            self.logger.warning(f"Impossibile scrivere la cache Parquet {parquet_path}: {str(e)}")
     
-    def save_data(self, output_path: Optional[str] = None) -> None:
-        """Salva i dati in un nuovo file Excel."""
+    def save_data(self, output_path: Optional[str] = None, excel: bool = True) -> None:
+        """Salva i dati in Parquet e, se richiesto, in un nuovo file Excel."""
         if self.df is None:
             raise ValueError("Nessun dato da salvare")
         
-        output_path = output_path or self.excel_path.parent / f"{self.excel_path.stem}_enriched.xlsx"
+        output_path = Path(output_path or self.excel_path.parent / f"{self.excel_path.stem}_enriched.xlsx")
+        parquet_path = output_path.with_suffix('.parquet')
+        
+        if not excel:
+            self._write_parquet(self.df, parquet_path)
+            self.logger.info(f"Dati salvati in: {parquet_path}")
+            return
         
         # Crea una copia del DataFrame per il salvataggio
         df_to_save = self.df.copy()
         
         # Formatta le date
-        date_columns = ['Starting Year', 'End/Extension Year']
-        for col in date_columns:
+        for col in DATE_COLUMNS:
             if col in df_to_save.columns and pd.api.types.is_datetime64_any_dtype(df_to_save[col]):
                 df_to_save[col] = df_to_save[col].dt.strftime('%Y-%m-%d')
         
         # Salva il file
         df_to_save.to_excel(output_path, index=False)
+        # Scritto dopo l'Excel, così risulta più recente e viene usato da load_data
+        self._write_parquet(self.df, parquet_path)
         self.logger.info(f"Dati salvati in: {output_path}")
     
     def get_mission_data(self, mission_name: str) -> Dict:
@@ -128,11 +203,11 @@ class DataProcessor:
         if self.df is None:
             raise ValueError("Devi prima caricare i dati con load_data()")
         
-        mission_data = self.df[self.df['Mission Name'].str.lower() == mission_name.lower()]
-        if mission_data.empty:
+        rows = self._find_mission(mission_name)
+        if not rows:
             return {}
         
-        return mission_data.iloc[0].to_dict()
+        return self.df.loc[rows[0]].to_dict()
     
     def get_all_missions(self) -> List[str]:
         """Recupera la lista di tutte le missioni."""
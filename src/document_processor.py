@@ -1,53 +1,131 @@
 import fitz  # PyMuPDF
 import docx
+import io
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
 import re
 from datetime import datetime
+from functools import lru_cache
+
+# Pattern delle date, ciascuno con il proprio formato strptime
+_DATE_PATTERNS = [
+    (re.compile(r'\d{1,2}/\d{1,2}/\d{4}'), '%d/%m/%Y'),    # DD/MM/YYYY
+    (re.compile(r'\d{4}-\d{2}-\d{2}'), '%Y-%m-%d'),        # YYYY-MM-DD
+    (re.compile(r'\d{1,2}\.\d{1,2}\.\d{4}'), '%d.%m.%Y'),  # DD.MM.YYYY
+    (re.compile(r'\d{4}/\d{2}/\d{2}'), '%Y/%m/%d')         # YYYY/MM/DD
+]
+
+# Pattern per estrarre informazioni sulle missioni (il valore è nel gruppo 1).
+# Un pattern per campo: le etichette si sovrappongono ("Mission type: ...") e
+# un'unica alternanza perderebbe i campi contenuti nella riga di un altro
+_MISSION_PATTERNS = {
+    key: re.compile(pattern, re.IGNORECASE) for key, pattern in {
+        'budget': r'budget[:\s]+€?\s*([\d,.]+)',
+        'personnel': r'personnel[:\s]+(\d+)',
+        'start_date': r'start(?:ing)?\s*date[:\s]+([^\n]+)',
+        'end_date': r'end(?:ing)?\s*date[:\s]+([^\n]+)',
+        'location': r'location[:\s]+([^\n]+)',
+        'mandate': r'mandate[:\s]+([^\n]+)',
+        'mission_name': r'mission\s*(?:name)?[:\s]+([^\n]+)',
+        'country': r'country[:\s]+([^\n]+)',
+        'type': r'type[:\s]+([^\n]+)'
+    }.items()
+}
+
+# Tipo di conversione per campo (gli altri restano testo)
+_FIELD_KINDS = {
+    'budget': 'number',
+    'personnel': 'number',
+    'start_date': 'date',
+    'end_date': 'date'
+}
+
+# Importi: si tengono solo cifre ASCII e separatori, la virgola decimale diventa punto
+_NON_AMOUNT_RE = re.compile(r'[^0-9.,]')
+
+def _to_float(value: str) -> float:
+    """Converte un importo testuale (simboli di valuta, virgola decimale) in float."""
+    return float(_NON_AMOUNT_RE.sub('', value).replace(',', '.'))
+
+# Interi: solo cifre ASCII
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+
+def _to_int(value: str) -> int:
+    """Converte un numero testuale in intero tenendo solo le cifre."""
+    return int(_NON_DIGIT_RE.sub('', value))
+
+# Radici delle parole di intestazione → campo; il prefisso copre plurali e forme flesse
+# (costs, costi, costing, staffing, ...)
+_HEADER_STEMS = (
+    ('budget', 'budget'),
+    ('cost', 'budget'),
+    ('personnel', 'personnel'),
+    ('staff', 'personnel')
+)
+_HEADER_TOKEN_RE = re.compile(r'[^\W\d_]+')
+
+@lru_cache(maxsize=1024)
+def _header_field(token: str) -> Optional[str]:
+    """Campo associato a una parola di intestazione (già in minuscolo), se presente."""
+    for stem, field in _HEADER_STEMS:
+        if token.startswith(stem):
+            return field
+    return None
+_COLUMN_CONVERTERS = {'budget': _to_float, 'personnel': _to_int}
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, native_tables: bool = False):
         self.logger = logging.getLogger(__name__)
-        self.date_patterns = [
-            r'\d{1,2}/\d{1,2}/\d{4}',  # DD/MM/YYYY
-            r'\d{4}-\d{2}-\d{2}',      # YYYY-MM-DD
-            r'\d{1,2}\.\d{1,2}\.\d{4}', # DD.MM.YYYY
-            r'\d{4}/\d{2}/\d{2}'       # YYYY/MM/DD
-        ]
+        # Rilevatore di tabelle nativo di PyMuPDF (page.find_tables): più preciso ma molto più lento
+        self.native_tables = native_tables
     
-    def extract_from_pdf(self, pdf_path: str) -> Dict:
-        """Estrae testo e tabelle da un documento PDF."""
+    def _iter_pages(self, pdf_path: str) -> Iterator[Tuple[str, List]]:
+        """Restituisce testo e tabelle di un PDF una pagina alla volta."""
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            tables = []
-            
-            for page in doc:
-                text += page.get_text()
-                # Estrai tabelle (implementazione base)
-                tables.extend(self._extract_tables_from_page(page))
-            
-            return {
-                'text': text,
-                'tables': tables
-            }
+            with fitz.open(pdf_path) as doc:
+                for i in range(doc.page_count):
+                    page = doc.load_page(i)
+                    # Un'unica estrazione del testo per pagina, a blocchi (solo blocchi di testo)
+                    blocks = [b for b in page.get_text("blocks") if b[6] == 0]
+                    page_text = "".join(b[4] for b in blocks)
+                    # Euristica sulle righe; find_tables solo se abilitato e solo sulle pagine
+                    # in cui l'euristica ha già trovato righe candidate
+                    page_tables = self._extract_tables_from_page(page, blocks)
+                    if page_tables and self.native_tables:
+                        native_tables = [
+                            [[cell or '' for cell in row] for row in table.extract()]
+                            for table in page.find_tables().tables
+                        ]
+                        page_tables = native_tables or page_tables
+                    yield page_text, page_tables
+                    del page
         except Exception as e:
             self.logger.error(f"Errore nell'estrazione da PDF {pdf_path}: {str(e)}")
-            return {'text': '', 'tables': []}
+    
+    def extract_from_pdf(self, pdf_path: str) -> Dict:
+        """Estrae testo e tabelle da un documento PDF."""
+        text_parts = []
+        tables = []
+        
+        for page_text, page_tables in self._iter_pages(pdf_path):
+            text_parts.append(page_text)
+            tables.extend(page_tables)
+        
+        return {
+            'text': "".join(text_parts),
+            'tables': tables
+        }
     
     def extract_from_word(self, docx_path: str) -> Dict:
         """Estrae testo e tabelle da un documento Word."""
         try:
-            doc = docx.Document(docx_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            tables = []
-            
-            for table in doc.tables:
-                table_data = []
-                for row in table.rows:
-                    table_data.append([cell.text for cell in row.cells])
-                tables.append(table_data)
+            # Lettura in un'unica operazione: lo zip viene poi decompresso dalla memoria
+            with open(docx_path, 'rb') as f:
+                doc = docx.Document(io.BytesIO(f.read()))
+            # I paragrafi vuoti non portano dati: niente righe vuote nel testo
+            text = "\n".join(paragraph.text for paragraph in doc.paragraphs if paragraph.text)
+            tables = [[[cell.text for cell in row.cells] for row in table.rows] for table in doc.tables]
             
             return {
                 'text': text,
@@ -57,30 +135,35 @@ class DocumentProcessor:
             self.logger.error(f"Errore nell'estrazione da Word {docx_path}: {str(e)}")
             return {'text': '', 'tables': []}
     
-    def _extract_tables_from_page(self, page) -> List:
+    def _extract_tables_from_page(self, page, blocks: Optional[List] = None) -> List:
         """Estrae tabelle da una pagina PDF."""
         tables = []
         try:
-            # Estrai il testo della pagina
-            text = page.get_text()
-            lines = text.split('\n')
+            # Usa i blocchi di testo già estratti dal chiamante, se disponibili
+            if blocks is None:
+                blocks = [b for b in page.get_text("blocks") if b[6] == 0]
             
             # Cerca pattern di tabelle (righe con più di 2 colonne)
-            table_lines = []
             current_table = []
             
-            for line in lines:
-                # Rimuovi spazi extra e caratteri speciali
-                line = re.sub(r'\s+', ' ', line).strip()
-                
-                # Se la riga ha più di 2 colonne, potrebbe essere parte di una tabella
-                if len(line.split()) > 2:
-                    current_table.append(line.split())
-                elif current_table:
-                    # Se troviamo una riga vuota o con poche colonne dopo una tabella,
-                    # salviamo la tabella corrente
-                    tables.append(current_table)
-                    current_table = []
+            for block in blocks:
+                for line in block[4].splitlines():
+                    # Con meno di due spazi/tab (e nessun altro spazio Unicode) la riga non può
+                    # avere 3 colonne: si evita di allocare i token
+                    if line.isascii() and line.count(' ') + line.count('\t') < 2:
+                        cells = None
+                    else:
+                        # split() senza argomenti ignora già spazi multipli e bordi
+                        cells = line.split()
+                    
+                    # Se la riga ha più di 2 colonne, potrebbe essere parte di una tabella
+                    if cells and len(cells) > 2:
+                        current_table.append(cells)
+                    elif current_table:
+                        # Se troviamo una riga vuota o con poche colonne dopo una tabella,
+                        # salviamo la tabella corrente
+                        tables.append(current_table)
+                        current_table = []
             
             # Aggiungi l'ultima tabella se presente
             if current_table:
@@ -91,23 +174,19 @@ class DocumentProcessor:
         
         return tables
     
-    def _parse_date(self, date_str: str) -> Optional[datetime]:
-        """Converte una stringa di data in un oggetto datetime."""
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _parse_date(date_str: str) -> Optional[datetime]:
+        """Converte una stringa di data in un oggetto datetime (memoizzata)."""
         if not date_str:
             return None
             
-        for pattern in self.date_patterns:
-            match = re.search(pattern, date_str)
+        for pattern, fmt in _DATE_PATTERNS:
+            match = pattern.search(date_str)
             if match:
-                date_str = match.group(0)
                 try:
-                    # Prova diversi formati
-                    for fmt in ['%d/%m/%Y', '%Y-%m-%d', '%d.%m.%Y', '%Y/%m/%d']:
-                        try:
-                            return datetime.strptime(date_str, fmt)
-                        except ValueError:
-                            continue
-                except Exception:
+                    return datetime.strptime(match.group(0), fmt)
+                except ValueError:
                     continue
         return None
     
@@ -115,43 +194,29 @@ class DocumentProcessor:
         """Estrae dati specifici delle missioni dal testo."""
         data = {}
         
-        # Pattern per estrarre informazioni
-        patterns = {
-            'budget': r'budget[:\s]+€?\s*([\d,.]+)',
-            'personnel': r'personnel[:\s]+(\d+)',
-            'start_date': r'start(?:ing)?\s*date[:\s]+([^\n]+)',
-            'end_date': r'end(?:ing)?\s*date[:\s]+([^\n]+)',
-            'location': r'location[:\s]+([^\n]+)',
-            'mandate': r'mandate[:\s]+([^\n]+)',
-            'mission_name': r'mission\s*(?:name)?[:\s]+([^\n]+)',
-            'country': r'country[:\s]+([^\n]+)',
-            'type': r'type[:\s]+([^\n]+)'
-        }
-        
-        # Cerca i pattern nel testo
-        for key, pattern in patterns.items():
-            matches = re.finditer(pattern, text.lower())
-            for match in matches:
+        # Per ogni campo vale la prima occorrenza valida: la scansione del campo
+        # si ferma appena il valore è stato convertito
+        for key, pattern in _MISSION_PATTERNS.items():
+            kind = _FIELD_KINDS.get(key)
+            for match in pattern.finditer(text):
                 value = match.group(1).strip()
                 
                 # Converti le date
-                if 'date' in key:
+                if kind == 'date':
                     parsed_date = self._parse_date(value)
                     if parsed_date:
                         data[key] = parsed_date.strftime('%Y-%m-%d')
+                        break
                 # Converti i numeri
-                elif key in ['budget', 'personnel']:
+                elif kind == 'number':
                     try:
-                        if key == 'budget':
-                            # Rimuovi eventuali simboli di valuta e spazi
-                            value = re.sub(r'[^\d.,]', '', value)
-                            # Sostituisci la virgola con il punto per i decimali
-                            value = value.replace(',', '.')
-                        data[key] = float(value)
+                        data[key] = _to_float(value) if key == 'budget' else float(value)
+                        break
                     except ValueError:
                         self.logger.warning(f"Impossibile convertire {value} in numero per {key}")
                 else:
                     data[key] = value
+                    break
         
         return data
     
@@ -165,23 +230,30 @@ class DocumentProcessor:
         
         try:
             if file_path.suffix.lower() == '.pdf':
-                content = self.extract_from_pdf(str(file_path))
+                # Analizza pagina per pagina senza tenere in memoria l'intero testo;
+                # come nella scansione del testo completo, la prima occorrenza prevale
+                mission_data = {}
+                tables = []
+                for page_text, page_tables in self._iter_pages(str(file_path)):
+                    if len(mission_data) < len(_MISSION_PATTERNS):
+                        for key, value in self.extract_mission_data(page_text).items():
+                            mission_data.setdefault(key, value)
+                    tables.extend(page_tables)
             elif file_path.suffix.lower() in ['.docx', '.doc']:
                 content = self.extract_from_word(str(file_path))
+                mission_data = self.extract_mission_data(content['text'])
+                tables = content['tables']
             else:
                 self.logger.warning(f"Formato file non supportato: {file_path}")
                 return {}
             
-            # Estrai dati specifici delle missioni
-            mission_data = self.extract_mission_data(content['text'])
-            
             # Estrai dati dalle tabelle
-            table_data = self._extract_data_from_tables(content['tables'])
+            table_data = self._extract_data_from_tables(tables)
             mission_data.update(table_data)
             
             return {
                 'mission_data': mission_data,
-                'tables': content['tables']
+                'tables': tables
             }
             
         except Exception as e:
@@ -196,28 +268,20 @@ class DocumentProcessor:
             # Cerca intestazioni rilevanti
             headers = table[0] if table else []
             for i, header in enumerate(headers):
-                header = header.lower()
-                if 'budget' in header or 'cost' in header:
-                    # Cerca valori numerici nella colonna
-                    for row in table[1:]:
-                        if i < len(row):
-                            value = row[i]
-                            try:
-                                value = float(re.sub(r'[^\d.,]', '', value).replace(',', '.'))
-                                data['budget'] = value
-                                break
-                            except ValueError:
-                                continue
-                elif 'personnel' in header or 'staff' in header:
-                    # Cerca valori numerici nella colonna
-                    for row in table[1:]:
-                        if i < len(row):
-                            value = row[i]
-                            try:
-                                value = int(re.sub(r'[^\d]', '', value))
-                                data['personnel'] = value
-                                break
-                            except ValueError:
-                                continue
+                # Una ricerca per parola; il budget ha la precedenza
+                fields = {_header_field(token) for token in _HEADER_TOKEN_RE.findall(header.lower())}
+                key = 'budget' if 'budget' in fields else 'personnel' if 'personnel' in fields else None
+                if key is None:
+                    continue
+                
+                # Primo valore numerico valido nella colonna
+                convert = _COLUMN_CONVERTERS[key]
+                for row in table[1:]:
+                    if i < len(row) and row[i]:
+                        try:
+                            data[key] = convert(row[i])
+                            break
+                        except ValueError:
+                            continue
         
         return data 
\ No newline at end of file
@@ -1,59 +1,232 @@
 import logging
+import logging.handlers
+import ahocorasick
+import fitz  # PyMuPDF
 from pathlib import Path
 from data_processor import DataProcessor
 from document_processor import DocumentProcessor
 import yaml
 import os
 import sys
-from typing import Dict, Optional
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # parser libyaml (C)
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+DOCUMENT_SUFFIXES = ('.pdf', '.docx', '.doc')
+
+# DocumentProcessor del processo worker, creato da _init_worker
+_worker_processor: Optional[DocumentProcessor] = None
+
+# Coda dei record di log condivisa con i worker, creata da setup_logging
+_log_queue: Optional[multiprocessing.Queue] = None
 
 def setup_logging() -> None:
-    """Configura il logging."""
+    """Configura il logging.
+    
+    I record passano da una coda; file e stdout vengono scritti da un thread
+    QueueListener, così né il processo principale né i worker attendono l'I/O.
+    """
+    global _log_queue
+    if _log_queue is not None:
+        return
+    
     log_dir = Path('logs')
     log_dir.mkdir(exist_ok=True)
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_dir / 'data_processing.log'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_dir / 'data_processing.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    _log_queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(_log_queue))
+
+@lru_cache(maxsize=1)
+def _read_config(config_path: Path, mtime_ns: int) -> Dict:
+    """Legge il file YAML; mtime_ns fa parte della chiave della cache."""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_YamlLoader)
 
 def load_config() -> Dict:
-    """Carica la configurazione dal file YAML."""
+    """Carica la configurazione dal file YAML (riletta solo se il file cambia)."""
     config_path = Path('config/config.yaml')
     if not config_path.exists():
         raise FileNotFoundError(f"File di configurazione non trovato: {config_path}")
     
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return _read_config(config_path, config_path.stat().st_mtime_ns)
     except Exception as e:
         raise RuntimeError(f"Errore nel caricamento della configurazione: {str(e)}")
 
+def _init_worker(log_queue: Optional[multiprocessing.Queue] = None, native_tables: bool = False) -> None:
+    """Prepara il processo worker prima del primo documento."""
+    global _worker_processor
+    if log_queue is not None:
+        # I log del worker vanno alla coda del processo principale
+        root = logging.getLogger()
+        root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(logging.INFO)
+    
+    _worker_processor = DocumentProcessor(native_tables=native_tables)
+    
+    # Apre un PDF minimo in memoria per caricare MuPDF prima del primo documento reale
+    with fitz.open() as doc:
+        doc.new_page()
+        pdf_bytes = doc.tobytes()
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as doc:
+        doc.load_page(0).get_text()
+
+def _process_one(file_path: Path) -> Tuple[Path, Dict]:
+    """Processa un singolo documento in un processo worker."""
+    logging.info("Processando documento: %s", file_path)
+    try:
+        return file_path, _worker_processor.process_document(str(file_path))
+    except Exception as e:
+        logging.error("Errore nel processare il documento %s: %s", file_path, e)
+        return file_path, {}
+
+def _iter_documents(root: Path) -> Iterator[Path]:
+    """Percorre la cartella con os.scandir e restituisce solo i documenti supportati."""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # I link simbolici a cartelle non vengono seguiti (evita cicli)
+                    if entry.is_dir(follow_symlinks=False):
+                        # Salta le cartelle nascoste (.git, .cache, ...)
+                        if not entry.name.startswith('.'):
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(DOCUMENT_SUFFIXES) and entry.is_file():
+                        yield Path(entry.path)
+        except OSError as e:
+            logging.warning("Impossibile leggere la cartella: %s", e)
+
+def _run_pool(file_list: List[Path], max_workers: int,
+              native_tables: bool = False) -> Tuple[Dict[int, Tuple[Path, Dict]], List[int]]:
+    """Processa i file in un pool di processi.
+    
+    Restituisce i risultati completati, indicizzati per posizione in file_list, e le
+    posizioni dei file rimasti senza risultato perché un worker è terminato in modo
+    anomalo (es. crash nativo di MuPDF).
+    """
+    results = {}
+    broken = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(_log_queue, native_tables)) as executor:
+        futures = {}
+        for i, file_path in enumerate(file_list):
+            try:
+                futures[executor.submit(_process_one, file_path)] = i
+            except BrokenProcessPool:
+                broken.extend(range(i, len(file_list)))
+                break
+        
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except BrokenProcessPool:
+                broken.append(i)
+            except Exception as e:
+                logging.error("Errore nel processare il documento %s: %s", file_list[i], e)
+    
+    return results, sorted(broken)
+
 def process_documents(config: dict, doc_processor: DocumentProcessor) -> Dict:
     """Processa tutti i documenti nella cartella specificata."""
     documents_data = {}
     docs_dir = Path(config['configurazione']['documenti'])
     
     if not docs_dir.exists():
-        logging.error(f"Cartella documenti non trovata: {docs_dir}")
+        logging.error("Cartella documenti non trovata: %s", docs_dir)
         return documents_data
     
-    for file_path in docs_dir.glob('**/*'):
-        if file_path.suffix.lower() in ['.pdf', '.docx', '.doc']:
-            logging.info(f"Processando documento: {file_path}")
-            try:
-                doc_data = doc_processor.process_document(str(file_path))
-                if doc_data:
-                    documents_data[file_path.name] = doc_data
-            except Exception as e:
-                logging.error(f"Errore nel processare il documento {file_path}: {str(e)}")
+    # Ordine stabile tra esecuzioni: da esso dipende il documento scelto per ogni missione
+    file_list = sorted(_iter_documents(docs_dir))
+    max_workers = config['configurazione'].get('max_workers') or os.cpu_count()
+    
+    if max_workers == 1:
+        # Elaborazione seriale nel processo corrente
+        global _worker_processor
+        _worker_processor = doc_processor
+        results = list(map(_process_one, file_list))
+    else:
+        # Il parsing di PDF/Word è CPU-bound: un processo per core.
+        # Se un worker termina in modo anomalo si tengono i risultati già completati
+        # e i documenti rimasti vengono rielaborati in un nuovo pool
+        completed_by_index = {}
+        pending = list(range(len(file_list)))
+        while pending:
+            completed, broken = _run_pool([file_list[i] for i in pending], max_workers,
+                                          doc_processor.native_tables)
+            completed_by_index.update((pending[j], result) for j, result in completed.items())
+            broken = [pending[j] for j in broken]
+            if len(broken) < len(pending):
+                if broken:
+                    logging.warning("Pool di processi interrotto, rielaboro %d documenti", len(broken))
+                pending = broken
+                continue
+            
+            # Nessun progresso: ogni documento in un pool dedicato, per isolare quelli che causano il crash
+            for i in broken:
+                completed, failed = _run_pool([file_list[i]], 1, doc_processor.native_tables)
+                completed_by_index.update((i, result) for result in completed.values())
+                if failed:
+                    logging.error("Processo worker terminato in modo anomalo sul documento %s", file_list[i])
+            break
+        
+        # Risultati nell'ordine di file_list, indipendentemente dall'ordine di completamento
+        results = [completed_by_index[i] for i in sorted(completed_by_index)]
+    
+    for file_path, doc_data in results:
+        if doc_data:
+            documents_data[file_path.name] = doc_data
     
     return documents_data
 
+def match_missions_to_documents(missions: List[str], documents_data: Dict) -> Dict[str, str]:
+    """Associa a ogni missione il primo documento il cui nome la contiene (case insensitive)."""
+    # Automa Aho-Corasick sui nomi delle missioni: una sola scansione per nome di documento
+    automaton = ahocorasick.Automaton()
+    for mission_name in missions:
+        if not isinstance(mission_name, str) or not mission_name:
+            continue
+        key = mission_name.casefold()
+        if key in automaton:
+            automaton.get(key).append(mission_name)
+        else:
+            automaton.add_word(key, [mission_name])
+    
+    matches = {}
+    if len(automaton) == 0:
+        return matches
+    
+    automaton.make_automaton()
+    # casefold su entrambi i lati: confronto case insensitive anche per ß, ligature, ecc.
+    for doc_name in documents_data:
+        for _, names in automaton.iter(doc_name.casefold()):
+            for mission_name in names:
+                matches.setdefault(mission_name, doc_name)
+    return matches
+
 def main() -> Optional[int]:
     """Funzione principale."""
     try:
@@ -72,7 +245,7 @@ def main() -> Optional[int]:
         
         # Inizializza i processor
         data_processor = DataProcessor(str(excel_path))
-        doc_processor = DocumentProcessor()
+        doc_processor = DocumentProcessor(native_tables=config['configurazione'].get('native_tables', False))
         
         # Carica i dati Excel
         data_processor.load_data()
@@ -80,19 +253,19 @@ def main() -> Optional[int]:
         
         # Processa i documenti
         documents_data = process_documents(config, doc_processor)
-        logging.info(f"Processati {len(documents_data)} documenti")
+        logging.info("Processati %d documenti", len(documents_data))
         
         # Aggiorna i dati Excel con le informazioni estratte
+        missions = data_processor.get_all_missions()
+        matches = match_missions_to_documents(missions, documents_data)
         updated_missions = 0
-        for mission_name in data_processor.get_all_missions():
-            # Cerca corrispondenze nei documenti
-            for doc_name, doc_data in documents_data.items():
-                if mission_name.lower() in doc_name.lower():
-                    data_processor.add_mission_data(mission_name, doc_data['mission_data'])
-                    updated_missions += 1
-                    break
+        for mission_name in missions:
+            doc_name = matches.get(mission_name)
+            if doc_name is not None:
+                data_processor.add_mission_data(mission_name, documents_data[doc_name]['mission_data'])
+                updated_missions += 1
         
-        logging.info(f"Aggiornate {updated_missions} missioni con dati dai documenti")
+        logging.info("Aggiornate %d missioni con dati dai documenti", updated_missions)
         
         # Salva i dati arricchiti
         output_path = Path(config['configurazione']['processed_data']) / f"{excel_path.stem}_enriched.xlsx"
@@ -103,10 +276,10 @@ def main() -> Optional[int]:
         return 0
         
     except FileNotFoundError as e:
-        logging.error(f"Errore: {str(e)}")
+        logging.error("Errore: %s", e)
         return 1
     except Exception as e:
-        logging.error(f"Errore durante l'elaborazione: {str(e)}")
+        logging.error("Errore durante l'elaborazione: %s", e)
         return 1
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+from document_processor import DocumentProcessor
+
+def test_extract_mission_data_overlapping_labels():
+    """I campi contenuti nella riga della missione non devono andare persi."""
+    processor = DocumentProcessor()
+
+    data = processor.extract_mission_data("Mission type: peacekeeping")
+    assert data['type'] == 'peacekeeping'
+    assert data['mission_name'] == 'type: peacekeeping'
+
+    data = processor.extract_mission_data("Mission personnel: 50")
+    assert data['personnel'] == 50.0
+
+    data = processor.extract_mission_data("The mission country: Italy")
+    assert data['country'] == 'Italy'
+
+def test_extract_mission_data_first_valid_match():
+    """Per ogni campo vale la prima occorrenza convertibile."""
+    processor = DocumentProcessor()
+    text = "Start date: n/a\nStart date: 01/02/2005\nBudget: € 1.500\nBudget: 9\n"
+
+    data = processor.extract_mission_data(text)
+    assert data['start_date'] == '2005-02-01'
+    assert data['budget'] == 1.5
+
+def test_extract_data_from_tables_inflected_headers():
+    """Le intestazioni flesse (Staffing, Costing, Costi) vengono riconosciute."""
+    processor = DocumentProcessor()
+
+    assert processor._extract_data_from_tables([[['Staffing'], ['5']]]) == {'personnel': 5}
+    assert processor._extract_data_from_tables([[['Costing (€)'], ['€ 3,5']]]) == {'budget': 3.5}
+    assert processor._extract_data_from_tables([[['Costi totali', 'Personnel'], ['12', '40']]]) == {
+        'budget': 12.0, 'personnel': 40
+    }
+    assert processor._extract_data_from_tables([[['Location'], ['Mali']]]) == {}
+
+if __name__ == "__main__":
+    test_extract_mission_data_overlapping_labels()
+    test_extract_mission_data_first_valid_match()
+    test_extract_data_from_tables_inflected_headers()